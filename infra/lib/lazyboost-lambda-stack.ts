@@ -18,6 +18,7 @@
 
 import * as cdk from 'aws-cdk-lib';
 import { Duration } from 'aws-cdk-lib';
+import { AttributeType, BillingMode, Table } from 'aws-cdk-lib/aws-dynamodb';
 import { RuleTargetInput } from 'aws-cdk-lib/aws-events';
 import { Architecture, AssetCode, Function, LayerVersion, Runtime } from 'aws-cdk-lib/aws-lambda';
 import { Secret } from 'aws-cdk-lib/aws-secretsmanager';
@@ -54,6 +55,13 @@ export class LazyboostLambdaStack extends cdk.Stack {
 
     lazyboostSNSTopic.addSubscription(new EmailSubscription(lazyboostErrorEmail));
 
+    // Small, frequently written state kept out of the versioned secret, e.g. the token refresh lease
+    const lazyboostStateTable = new Table(this, 'LazyBoostStateTable', {
+      partitionKey: { name: 'pk', type: AttributeType.STRING },
+      billingMode: BillingMode.PAY_PER_REQUEST,
+      removalPolicy: cdk.RemovalPolicy.RETAIN,
+    });
+
     // Lambda layer with Python dependencies
     const dependenciesLayer = new LayerVersion(this, 'LazyBoostDependencies', {
       layerVersionName: 'LazyBoostDependencies',
@@ -77,11 +85,18 @@ export class LazyboostLambdaStack extends cdk.Stack {
         SYNC_INTERVAL_ORDERS_MIN: '20',
         SYNC_INTERVAL_REVIEWS_MIN: '17',
         SYNC_INTERVAL_LISTINGS_MIN: '17',
+        // /tmp does not survive cold starts, keep the sync checkpoints in the state table
+        CHECKPOINT_BACKEND: 'dynamodb',
+        // the working directory is read-only, failed reviews are retried from the checkpoint
+        REVIEW_EXPORT_DIR: '/tmp',
+        LAZYBOOST_STATE_TABLE: lazyboostStateTable.tableName,
+        ETSY_TOKEN_LEASE_BACKEND: 'dynamodb',
       }
     });
     props.lbSecret.grantRead(lazyboost_lambda);
     props.lbSecret.grantWrite(lazyboost_lambda);
     lazyboostSNSTopic.grantPublish(lazyboost_lambda);
+    lazyboostStateTable.grantReadWriteData(lazyboost_lambda);
 
     new cdk.aws_events.Rule(this, 'order-sync-rule', {
       description: 'Rule to sync orders between Etsy and Shopify',
@@ -112,6 +112,7 @@ const handler = async function (event, context) {
   responseSecrets = JSON.parse(response.body);
   secretString.ETSY_ACCESS_TOKEN = responseSecrets.access_token;
   secretString.ETSY_REFRESH_TOKEN = responseSecrets.refresh_token;
+  secretString.ETSY_ACCESS_TOKEN_EXPIRES_AT = Math.floor(Date.now() / 1000) + responseSecrets.expires_in;
   await updateSecret(secretString);
 
   return {
@@ -0,0 +1,121 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+import_time_report script measures the Lambda cold start import cost of every task with
+`python -X importtime`, and compares it against importing all handlers up front.
+
+Usage: PYTHONPATH=./src python scripts/import_time_report.py [--repeat 10] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Set
+
+from lazyboost.index import TASKS
+
+# everything a task could need, as if all handlers and clients were imported up front
+EAGER_CODE = "; ".join(
+    [
+        "import boto3",
+        "import lazyboost.index",
+        "from lazyboost.clients import *",
+        "from lazyboost.handlers import *",
+        "import lazyboost.clients.async_etsy_client",
+    ]
+)
+
+
+def _import_times(code: str) -> List[tuple]:
+    """
+    Run code in a fresh interpreter and parse the -X importtime output.
+    :return: list, (depth, module, self us, cumulative us) per imported module.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=os.environ,
+        check=True,
+    )
+    import_times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        import_times.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return import_times
+
+
+def _startup_modules() -> Set[str]:
+    return {name for depth, name, _, _ in _import_times("pass") if depth == 0}
+
+
+def _measure(code: str, startup_modules: Set[str]) -> tuple:
+    """
+    :return: tuple, (total import ms, top level module -> cumulative ms, module -> self ms)
+    """
+    import_times = _import_times(code)
+    top_level = {
+        name: cumulative_us / 1000
+        for depth, name, _, cumulative_us in import_times
+        if depth == 0 and name not in startup_modules
+    }
+    self_ms = {name: self_us / 1000 for _, name, self_us, _ in import_times}
+    return sum(top_level.values()), top_level, self_ms
+
+
+def _median_ms(code: str, repeat: int, startup_modules: Set[str]) -> tuple:
+    runs = [_measure(code, startup_modules) for _ in range(repeat)]
+    return statistics.median(total for total, _, _ in runs), runs[-1][2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10, help="runs per measurement, median")
+    parser.add_argument("--top", type=int, default=10, help="heaviest modules listed per task")
+    args = parser.parse_args()
+
+    startup_modules = _startup_modules()
+    eager_ms, _ = _median_ms(EAGER_CODE, args.repeat, startup_modules)
+    index_ms, _ = _median_ms("import lazyboost.index", args.repeat, startup_modules)
+
+    task_results: Dict[str, tuple] = {}
+    for task in TASKS:
+        code = f"import lazyboost.index; lazyboost.index.load_task_handler({task!r})"
+        task_results[task] = _median_ms(code, args.repeat, startup_modules)
+
+    print(f"Median import time over {args.repeat} runs, everything up front: {eager_ms:.1f} ms\n")
+    print(f"{'task':<16}{'import ms':>12}{'saved ms':>12}{'saved %':>10}")
+    print(
+        f"{'(dispatch)':<16}{index_ms:>12.1f}{eager_ms - index_ms:>12.1f}"
+        f"{100 * (eager_ms - index_ms) / eager_ms:>9.1f}%"
+    )
+    for task, (task_ms, _) in task_results.items():
+        saved_ms = eager_ms - task_ms
+        print(f"{task:<16}{task_ms:>12.1f}{saved_ms:>12.1f}{100 * saved_ms / eager_ms:>9.1f}%")
+
+    for task, (_, self_ms) in task_results.items():
+        print(f"\nHeaviest modules (self ms) for {task}:")
+        for name, ms in sorted(self_ms.items(), key=lambda item: -item[1])[: args.top]:
+            print(f"  {ms:8.2f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -109,9 +109,23 @@ def create_parser() -> ArgumentParser:
         const="s2e",
     )
 
-    options_subparser.add_parser("review-sync", help="listings help")
+    review_sync_parser = options_subparser.add_parser("review-sync", help="listings help")
+    review_sync_parser.add_argument(
+        "-b",
+        "--bulk",
+        help="Publish reviews to JudgeMe in concurrent batches instead of one by one",
+        action="store_true",
+        dest="bulk_publish",
+    )
 
     listings_parser = options_subparser.add_parser("listings", help="listings help")
+    listings_parser.add_argument(
+        "-f",
+        "--full",
+        help="Sync the full Shopify catalog using a bulk export instead of recent updates",
+        action="store_true",
+        dest="full_sync",
+    )
 
     return parser
 
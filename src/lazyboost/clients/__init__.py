@@ -14,10 +14,31 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
+"""
+clients package exports the API clients, each client module is only imported on first access.
+"""
+import importlib
 
-from lazyboost.clients.etsy_client import EtsyClient
-from lazyboost.clients.judge_me_client import JudgeMeClient
-from lazyboost.clients.secret_manager_client import SecretManagerClient
-from lazyboost.clients.shopify_client import ShopifyClient
+_EXPORTS = {
+    "AsyncEtsyClient": "lazyboost.clients.async_etsy_client",
+    "EtsyClient": "lazyboost.clients.etsy_client",
+    "EtsyRateLimiter": "lazyboost.clients.etsy_rate_limiter",
+    "HttpSessionPool": "lazyboost.clients.http_session_pool",
+    "JudgeMeClient": "lazyboost.clients.judge_me_client",
+    "SecretManagerClient": "lazyboost.clients.secret_manager_client",
+    "ShopifyClient": "lazyboost.clients.shopify_client",
+}
 
-__all__ = [EtsyClient, SecretManagerClient, ShopifyClient]
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,111 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+async_etsy_client module provides an asyncio variant of the EtsyClient.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from aws_lambda_powertools import Logger
+
+from lazyboost.clients.etsy_client import EtsyClient
+
+logger = Logger()
+
+
+class AsyncEtsyClient:
+    """
+    asyncio variant of EtsyClient with the same method surface.
+    Requests run on a dedicated thread pool over the pooled Etsy session, so tokens, headers and
+    the shared rate limiter stay in one place and concurrent calls are still paced.
+    """
+
+    def __init__(self, etsy_client: EtsyClient = None, max_concurrency: int = None):
+        self.etsy_client = etsy_client or EtsyClient()
+        self.max_concurrency = max_concurrency or int(os.getenv("ETSY_MAX_CONCURRENCY", 8))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="etsy-async"
+        )
+
+    async def __aenter__(self) -> "AsyncEtsyClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def get_shop_receipts(self):
+        """
+        Retrieve Etsy shop receipts.
+        """
+        return await self._run(self.etsy_client.get_shop_receipts)
+
+    async def get_shop_receipt(self, receipt_id: int):
+        """
+        Retrieve Etsy shop receipt by id.
+        """
+        return await self._run(self.etsy_client.get_shop_receipt, receipt_id)
+
+    async def get_shop_reviews(self):
+        """
+        Retrieve Etsy shop reviews.
+        """
+        return await self._run(self.etsy_client.get_shop_reviews)
+
+    async def get_uer_info(self, user_id: int):
+        """
+        Retrieves Etsy user information with user_id.
+        """
+        return await self._run(self.etsy_client.get_uer_info, user_id)
+
+    async def get_shop_transaction(self, transaction_id: int):
+        """
+        Retrieves Etsy transaction with transaction_id.
+        """
+        return await self._run(self.etsy_client.get_shop_transaction, transaction_id)
+
+    async def get_shipping_profiles(self):
+        """
+        Retrieves shipping profiles based on shop id.
+        """
+        return await self._run(self.etsy_client.get_shipping_profiles)
+
+    async def get_return_policies(self):
+        """
+        Retrieves return policies based on shop id.
+        """
+        return await self._run(self.etsy_client.get_return_policies)
+
+    async def get_shop_sections(self):
+        """
+        Retrieves shop sections based on shop id.
+        """
+        return await self._run(self.etsy_client.get_shop_sections)
+
+    async def create_listing(self, data: dict):
+        """
+        Create listing based on data.
+        """
+        return await self._run(self.etsy_client.create_listing, data)
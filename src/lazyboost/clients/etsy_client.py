@@ -15,15 +15,25 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 from urllib.parse import urljoin
 
-import requests
 from aws_lambda_powertools import Logger
 
+from lazyboost.clients.etsy_rate_limiter import EtsyQuotaState, EtsyRateLimiter
+from lazyboost.clients.http_session_pool import HttpSessionPool
 from lazyboost.clients.secret_manager_client import SecretManagerClient
+from lazyboost.clients.token_refresh_lease import token_refresh_lease_from_env
 from lazyboost.models.base_singleton import singleton
+from lazyboost.models.etsy_order import EtsyOrder
+from lazyboost.models.etsy_review_model import EtsyReview
+from lazyboost.models.etsy_transaction_model import EtsyTransaction
 from lazyboost.utilities import constants
 
 logger = Logger()
@@ -37,43 +47,56 @@ class EtsyClient:
         self.shared_secret = self.sm_client.secret_variables["ETSY_SHARED_SECRET"]
         self.access_token = self.sm_client.secret_variables["ETSY_ACCESS_TOKEN"]
         self.refresh_token = self.sm_client.secret_variables["ETSY_REFRESH_TOKEN"]
+        self.access_token_expires_at = int(
+            self.sm_client.secret_variables.get("ETSY_ACCESS_TOKEN_EXPIRES_AT", 0)
+        )
         self.shop_id = self.sm_client.secret_variables["ETSY_SHOP_ID"]
 
         self.sync_interval_orders = int(os.getenv("SYNC_INTERVAL_ORDERS_MIN", 20))
         self.sync_interval_reviews = int(os.getenv("SYNC_INTERVAL_REVIEWS_MIN", 17))
+        self.token_refresh_skew = int(os.getenv("ETSY_TOKEN_REFRESH_SKEW_SEC", 300))
+        self.token_refresh_stats = {"proactive": 0, "reactive": 0}
+        self._proactive_refresh_retry_at = 0.0
+        # single-flight refresh, a thread lock in process and a lease across processes
+        self._refresh_lock = threading.Lock()
+        self.token_lease = token_refresh_lease_from_env()
+        self.token_lease_owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
 
         self.headers = {
             "x-api-key": f"{self.api_key_string}:{self.shared_secret}",
             "Authorization": f"Bearer {self.access_token}",
         }
+        self.session = HttpSessionPool().get_session(constants.ETSY_API_BASE_URL, self.headers)
+        self.rate_limiter = EtsyRateLimiter()
+        self._ensure_fresh_token()
+
+    @property
+    def quota_state(self) -> EtsyQuotaState:
+        return self.rate_limiter.quota_state
 
-    def _http_oauth_request(self, method, suffix, params: dict = None, data: dict = None):
+    def _http_oauth_request(
+        self, method, suffix, params: dict = None, data: dict = None, json: dict = None
+    ):
         """
         Execute HTTP API requests for Etsy REST API.
         """
         request_url = urljoin(constants.ETSY_API_BASE_URL, suffix)
         logger.debug(f"Sending {method} request to {request_url}, params: {params}, data: {data}")
 
-        response = requests.request(
-            method=method,
-            url=request_url,
-            headers=self.get_request_header(),
-            params=params,
-            data=data,
-        )
+        self._ensure_fresh_token()
+        response = self._send_paced_request(method, request_url, params, data, json)
 
         logger.debug(f"STATUS_CODE: {response.status_code} | URL: {request_url}")
 
         if response.status_code == 401 and response.json().get("error") == "invalid_token":
+            self.token_refresh_stats["reactive"] += 1
+            logger.warning(
+                "Access token rejected, refreshing after a failed request",
+                token_refresh_stats=self.token_refresh_stats,
+            )
             self._refresh_token()
             logger.info("Retrying API call after Token Refresh...")
-            response = requests.request(
-                method=method,
-                url=request_url,
-                headers=self.get_request_header(),
-                params=params,
-                data=data,
-            )
+            response = self._send_paced_request(method, request_url, params, data, json)
 
         if response.status_code in [200, 201]:
             return response.json()
@@ -82,29 +105,181 @@ class EtsyClient:
                 f"Could Not Connect. Status Code: {response.status_code} {response.reason}"
             )
 
-    def _refresh_token(self):
+    def _send_paced_request(
+        self, method, request_url, params: dict = None, data: dict = None, json: dict = None
+    ):
+        """
+        Send a request once the shared rate limiter allows it, retrying 429 responses after
+        the server provided delay.
+        """
+        for attempt in range(constants.ETSY_MAX_THROTTLE_RETRIES + 1):
+            self.rate_limiter.acquire()
+            response = self.session.request(
+                method=method,
+                url=request_url,
+                headers=self.get_request_header(method),
+                params=params,
+                data=data,
+                json=json,
+            )
+            self.rate_limiter.update_from_headers(response.headers)
+
+            if response.status_code != 429 or attempt == constants.ETSY_MAX_THROTTLE_RETRIES:
+                return response
+
+            self.rate_limiter.throttle(response.headers.get("retry-after"))
+            logger.info(f"Retrying throttled API call, attempt {attempt + 1}...")
+        return response
+
+    def _is_token_expiring(self) -> bool:
+        return time.time() >= self.access_token_expires_at - self.token_refresh_skew
+
+    def _ensure_fresh_token(self):
+        """
+        Refresh Etsy Oauth tokens ahead of expiry, so requests never carry an expired token.
+        Does nothing while the stored expiry is further away than ETSY_TOKEN_REFRESH_SKEW_SEC.
+        """
+        if not self._is_token_expiring() or time.time() < self._proactive_refresh_retry_at:
+            return
+
+        logger.info("Access token is about to expire, refreshing ahead of expiry...")
+        if self._refresh_token():
+            self.token_refresh_stats["proactive"] += 1
+            logger.info("Refreshed access token", token_refresh_stats=self.token_refresh_stats)
+        else:
+            # don't retry on every request, the 401 path still covers an actually expired token
+            self._proactive_refresh_retry_at = time.time() + constants.ETSY_TOKEN_REFRESH_BACKOFF
+            logger.warning("Proactive token refresh failed, falling back to refresh on 401")
+
+    def _refresh_token(self) -> bool:
         """
         Update Etsy Oauth tokens after expiration.
+        Only one caller refreshes at a time. Threads queue up on a lock, and processes on the
+        token refresh lease. Whoever waited picks up the tokens of the winner from the secret
+        instead of refreshing again, which would invalidate the winner's refresh token.
+        :return: bool, True if the tokens were refreshed.
+        """
+        stale_access_token = self.access_token
+        with self._refresh_lock:
+            if self.access_token != stale_access_token:
+                logger.debug("Tokens were refreshed by another thread")
+                return True
+
+            deadline = time.time() + constants.ETSY_TOKEN_LEASE_WAIT_SEC
+            while not self.token_lease.acquire(
+                self.token_lease_owner, constants.ETSY_TOKEN_LEASE_TTL_SEC
+            ):
+                if self._reload_tokens():
+                    logger.info("Tokens were refreshed by another process")
+                    return True
+                if time.time() >= deadline:
+                    logger.error("Timed out waiting for the token refresh lease")
+                    return False
+                time.sleep(constants.ETSY_TOKEN_LEASE_POLL_SEC)
+
+            try:
+                if self._reload_tokens():
+                    logger.info("Tokens were refreshed by another process")
+                    return True
+                return self._request_tokens()
+            finally:
+                self.token_lease.release(self.token_lease_owner)
+
+    def _reload_tokens(self) -> bool:
+        """
+        Adopt newer tokens from the secret, written by another process.
+        :return: bool, True if the adopted access token is not about to expire.
+        """
+        secret_variables = self.sm_client.get_secret_variables(force_refresh=True)
+        if secret_variables["ETSY_ACCESS_TOKEN"] == self.access_token:
+            return False
+
+        self.access_token = secret_variables["ETSY_ACCESS_TOKEN"]
+        self.refresh_token = secret_variables["ETSY_REFRESH_TOKEN"]
+        self.access_token_expires_at = int(secret_variables.get("ETSY_ACCESS_TOKEN_EXPIRES_AT", 0))
+        self.set_headers()
+        return not self._is_token_expiring()
+
+    def _request_tokens(self) -> bool:
+        """
+        Exchange the refresh token for new tokens at the Etsy token endpoint.
         """
         logger.debug("Attempting to update Access and Refresh tokens...")
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        # token endpoint shares the pooled Etsy session, drop the expired bearer header
+        headers = {"Content-Type": "application/x-www-form-urlencoded", "Authorization": None}
         data = {
             "grant_type": "refresh_token",
             "client_id": self.api_key_string,
             "refresh_token": self.refresh_token,
         }
-        resp = requests.post(constants.ETSY_TOKEN_URL, headers=headers, data=data)
+        resp = self.session.post(constants.ETSY_TOKEN_URL, headers=headers, data=data)
         if resp.status_code == 200:
             logger.debug("Successfully updated Access and Refresh tokens...")
             self.update_tokens(resp.json())
             self.set_headers()
+            return True
+
+        logger.error(f"Failed to refresh tokens. Status Code: {resp.status_code} {resp.reason}")
+        return False
+
+    def _iter_pages(
+        self,
+        path: str,
+        params: dict,
+        decoder: Callable[[dict], Any],
+        prefetch: bool = True,
+    ) -> Iterator[List[Any]]:
+        """
+        Follow limit/offset pagination of an Etsy list endpoint and yield decoded pages.
+        With prefetch, the next page is requested while the caller works on the current one,
+        so no more than two pages are held in memory regardless of the window size.
+        :param path: str, API path of the list endpoint.
+        :param params: dict, query params of the endpoint, limit defaults to ETSY_PAGE_LIMIT.
+        :param decoder: callable, turns a single result dict into a model.
+        :param prefetch: bool, fetch the next page in the background.
+        """
+        limit = int(params.get("limit", constants.ETSY_PAGE_LIMIT))
+
+        def fetch_page(page_offset: int) -> dict:
+            page_params = dict(params, limit=limit, offset=page_offset)
+            return self._http_oauth_request("GET", path, params=page_params)
+
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            offset = 0
+            response = fetch_page(offset)
+            while True:
+                results = response.get("results", [])
+                offset += len(results)
+                if "count" in response:
+                    has_next_page = bool(results) and offset < int(response["count"])
+                else:
+                    has_next_page = len(results) == limit
+
+                next_page = None
+                if has_next_page and executor:
+                    next_page = executor.submit(fetch_page, offset)
+
+                logger.debug(f"Retrieved page of {len(results)} results from {path}")
+                yield [decoder(r) for r in results]
+
+                if not has_next_page:
+                    break
+                response = next_page.result() if next_page else fetch_page(offset)
+        finally:
+            if executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _window_start(interval_minutes: int) -> int:
+        return int(round((datetime.now() - timedelta(minutes=interval_minutes)).timestamp()))
 
     def get_request_header(self, method: str = "GET") -> Dict[str, str]:
         """
         Return the headers for the request based on method type.
-        POST method requires Content-Type for Etsy API.
+        POST and PATCH methods require Content-Type for Etsy API.
         """
-        if method.casefold() == "post":
+        if method.casefold() in ("post", "patch"):
             request_headers = self.headers.copy()
             request_headers.update({"Content-Type": "application/x-www-form-urlencoded"})
             return request_headers
@@ -117,8 +292,12 @@ class EtsyClient:
         """
         self.access_token = response_dict.get("access_token")
         self.refresh_token = response_dict.get("refresh_token")
+        self.access_token_expires_at = int(time.time()) + int(response_dict.get("expires_in", 0))
         self.sm_client.secret_variables["ETSY_ACCESS_TOKEN"] = self.access_token
         self.sm_client.secret_variables["ETSY_REFRESH_TOKEN"] = self.refresh_token
+        self.sm_client.secret_variables["ETSY_ACCESS_TOKEN_EXPIRES_AT"] = (
+            self.access_token_expires_at
+        )
         self.sm_client.update_secret_manager()
 
     def set_headers(self):
@@ -129,6 +308,7 @@ class EtsyClient:
             "x-api-key": f"{self.api_key_string}:{self.shared_secret}",
             "Authorization": f"Bearer {self.access_token}",
         }
+        self.session.headers.update(self.headers)
 
     def get_shop_receipts(self):
         """
@@ -140,11 +320,7 @@ class EtsyClient:
             "GET",
             path,
             params={
-                "min_created": int(
-                    round(
-                        (datetime.now() - timedelta(minutes=self.sync_interval_orders)).timestamp()
-                    )
-                ),
+                "min_created": self._window_start(self.sync_interval_orders),
                 "max_created": int(round(datetime.now().timestamp())),
                 "sort_order": "ascending",
                 "was_shipped": False,
@@ -154,6 +330,93 @@ class EtsyClient:
         )
         return response
 
+    def iter_shop_receipts(
+        self,
+        min_created: Optional[int] = None,
+        max_created: Optional[int] = None,
+        prefetch: bool = True,
+        min_last_modified: Optional[int] = None,
+        max_last_modified: Optional[int] = None,
+        **filters,
+    ) -> Iterator[EtsyOrder]:
+        """
+        Iterate over all Etsy shop receipts in the window, following pagination to the end.
+        :param min_created: int, epoch seconds lower bound, defaults to the order sync interval.
+        :param max_created: int, epoch seconds upper bound, defaults to now.
+        :param prefetch: bool, fetch the next page while the current one is being consumed.
+        :param min_last_modified: int, epoch seconds lower bound of the last receipt update,
+                                  replaces the default creation window.
+        :param max_last_modified: int, epoch seconds upper bound of the last receipt update.
+        :param filters: receipt filters overriding the open order defaults, None drops a filter.
+        """
+        logger.info("Retrieving shop receipts...")
+        if min_last_modified is not None:
+            filters = {
+                "min_created": min_created,
+                "max_created": max_created,
+                "min_last_modified": min_last_modified,
+                "max_last_modified": max_last_modified,
+                **filters,
+            }
+        params = self._receipt_params(min_created, max_created, filters)
+        path = f"shops/{self.shop_id}/receipts"
+        for page in self._iter_pages(path, params, EtsyOrder.from_dict, prefetch):
+            yield from page
+
+    def iter_receipt_transactions(
+        self,
+        min_created: int,
+        max_created: Optional[int] = None,
+        prefetch: bool = True,
+    ) -> Iterator[Tuple[EtsyTransaction, EtsyOrder]]:
+        """
+        Iterate over the transactions embedded in all shop receipts of the window, newest first,
+        regardless of the receipt status. One page covers up to ETSY_PAGE_LIMIT receipts.
+        :param min_created: int, epoch seconds lower bound of the receipt creation.
+        :param max_created: int, epoch seconds upper bound, defaults to now.
+        :param prefetch: bool, fetch the next page while the current one is being consumed.
+        """
+        logger.info("Retrieving shop receipts with transactions...")
+        params = self._receipt_params(
+            min_created,
+            max_created,
+            {
+                "sort_order": "descending",
+                "was_shipped": None,
+                "was_paid": None,
+                "was_canceled": None,
+            },
+        )
+
+        def decode_receipt(receipt: dict) -> List[Tuple[EtsyTransaction, EtsyOrder]]:
+            etsy_order = EtsyOrder.from_dict(receipt)
+            return [(EtsyTransaction.from_dict(t), etsy_order) for t in receipt["transactions"]]
+
+        path = f"shops/{self.shop_id}/receipts"
+        for page in self._iter_pages(path, params, decode_receipt, prefetch):
+            for receipt_transactions in page:
+                yield from receipt_transactions
+
+    def _receipt_params(
+        self, min_created: Optional[int], max_created: Optional[int], filters: dict
+    ) -> dict:
+        params = {
+            "min_created": (
+                self._window_start(self.sync_interval_orders)
+                if min_created is None
+                else min_created
+            ),
+            "max_created": (
+                int(round(datetime.now().timestamp())) if max_created is None else max_created
+            ),
+            "sort_order": "ascending",
+            "was_shipped": False,
+            "was_paid": True,
+            "was_canceled": False,
+        }
+        params.update(filters)
+        return {k: v for k, v in params.items() if v is not None}
+
     def get_shop_receipt(self, receipt_id: int):
         """
         Retrieve Etsy shop receipt by id.
@@ -173,16 +436,39 @@ class EtsyClient:
             "GET",
             path,
             params={
-                "min_created": int(
-                    round(
-                        (datetime.now() - timedelta(minutes=self.sync_interval_reviews)).timestamp()
-                    )
-                ),
+                "min_created": self._window_start(self.sync_interval_reviews),
                 "max_created": int(round(datetime.now().timestamp())),
             },
         )
         return response
 
+    def iter_shop_reviews(
+        self,
+        min_created: Optional[int] = None,
+        max_created: Optional[int] = None,
+        prefetch: bool = True,
+    ) -> Iterator[EtsyReview]:
+        """
+        Iterate over all Etsy shop reviews in the window, following pagination to the end.
+        :param min_created: int, epoch seconds lower bound, defaults to the review sync interval.
+        :param max_created: int, epoch seconds upper bound, defaults to now.
+        :param prefetch: bool, fetch the next page while the current one is being consumed.
+        """
+        logger.debug("Retrieving shop reviews...")
+        params = {
+            "min_created": (
+                self._window_start(self.sync_interval_reviews)
+                if min_created is None
+                else min_created
+            ),
+            "max_created": (
+                int(round(datetime.now().timestamp())) if max_created is None else max_created
+            ),
+        }
+        path = f"shops/{self.shop_id}/reviews"
+        for page in self._iter_pages(path, params, EtsyReview.from_dict, prefetch):
+            yield from page
+
     def get_uer_info(self, user_id: int):
         """
         Retrieves Etsy user information with user_id.
@@ -210,6 +496,23 @@ class EtsyClient:
         )
         return response
 
+    def iter_shop_transactions(
+        self, min_created: int, prefetch: bool = True
+    ) -> Iterator[EtsyTransaction]:
+        """
+        Iterate over the Etsy shop transactions created since min_created, newest first.
+        The endpoint has no date filter, pagination stops at the first older transaction.
+        :param min_created: int, epoch seconds lower bound of the transaction creation.
+        :param prefetch: bool, fetch the next page while the current one is being consumed.
+        """
+        logger.debug("Retrieving shop transactions...")
+        path = f"shops/{self.shop_id}/transactions"
+        for page in self._iter_pages(path, {}, EtsyTransaction.from_dict, prefetch):
+            for transaction in page:
+                if transaction.create_timestamp < min_created:
+                    return
+                yield transaction
+
     def get_shipping_profiles(self):
         """
         Retrieves shipping profiles based on shop id.
@@ -246,6 +549,17 @@ class EtsyClient:
         )
         return response
 
+    def iter_shop_listings(self, state: str = "active", prefetch: bool = True) -> Iterator[dict]:
+        """
+        Iterate over the shop listings in a state, following pagination to the end.
+        :param state: str, listing state, e.g. active, inactive or draft.
+        :param prefetch: bool, fetch the next page while the current one is being consumed.
+        """
+        logger.debug(f"Retrieving {state} shop listings...")
+        path = f"shops/{self.shop_id}/listings"
+        for page in self._iter_pages(path, {"state": state}, lambda listing: listing, prefetch):
+            yield from page
+
     def create_listing(self, data: dict):
         """
         Create listing based on data.
@@ -259,3 +573,33 @@ class EtsyClient:
             data=data,
         )
         return response
+
+    def update_listing(self, listing_id: int, data: dict):
+        """
+        Update fields of an existing listing.
+        :param listing_id: int, Etsy listing id.
+        :param data: dict, listing fields to update.
+        """
+        logger.debug(f"Updating listing {listing_id}")
+        path = f"shops/{self.shop_id}/listings/{listing_id}"
+        response = self._http_oauth_request(
+            "PATCH",
+            path,
+            data=data,
+        )
+        return response
+
+    def update_listing_inventory(self, listing_id: int, data: dict):
+        """
+        Replace the inventory, i.e. products and offerings, of an existing listing.
+        :param listing_id: int, Etsy listing id.
+        :param data: dict, inventory with the products of the listing.
+        """
+        logger.debug(f"Updating inventory of listing {listing_id}")
+        path = f"listings/{listing_id}/inventory"
+        response = self._http_oauth_request(
+            "PUT",
+            path,
+            json=data,
+        )
+        return response
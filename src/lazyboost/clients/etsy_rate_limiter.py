@@ -0,0 +1,202 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+etsy_rate_limiter module paces Etsy API calls based on the quota headers Etsy returns.
+"""
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Mapping, Optional
+
+from aws_lambda_powertools import Logger
+
+from lazyboost.models.base_singleton import singleton
+from lazyboost.utilities import constants
+
+logger = Logger()
+
+
+@dataclass
+class EtsyQuotaState:
+    limit_per_second: int
+    remaining_this_second: Optional[int]
+    limit_per_day: Optional[int]
+    remaining_today: Optional[int]
+    paced_rate: float
+    requests_sent: int
+    throttled_responses: int
+    total_wait_seconds: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Callers reserve a token up front and sleep outside of the lock,
+    so waiting callers are released in order at the configured rate.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def reserve(self) -> float:
+        """
+        Take one token from the bucket.
+        :return: float, seconds the caller has to wait before the token is valid.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def drain(self):
+        """
+        Drop all available tokens, used when the server reports the current second as spent.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0)
+
+    def set_rate(self, rate: float, capacity: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.capacity = capacity
+            self._tokens = min(self._tokens, capacity)
+
+
+@singleton
+class EtsyRateLimiter:
+    """
+    Process wide limiter shared by every EtsyClient caller, including background threads.
+    Pacing starts at Etsy's documented default and follows the x-limit-per-second header once
+    a response has been seen, keeping ETSY_RATE_LIMIT_HEADROOM below the advertised limit.
+    """
+
+    def __init__(self):
+        self.headroom = float(os.getenv("ETSY_RATE_LIMIT_HEADROOM", 0.9))
+        self.limit_per_second = constants.ETSY_DEFAULT_LIMIT_PER_SECOND
+        self.remaining_this_second: Optional[int] = None
+        self.limit_per_day: Optional[int] = None
+        self.remaining_today: Optional[int] = None
+        self.requests_sent = 0
+        self.throttled_responses = 0
+        self.total_wait_seconds = 0.0
+
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.bucket = TokenBucket(*self._bucket_settings(self.limit_per_second))
+
+    def _bucket_settings(self, limit_per_second: int) -> tuple:
+        rate = max(limit_per_second * self.headroom, 0.5)
+        return rate, max(rate, 1.0)
+
+    def acquire(self):
+        """
+        Block until the next request may be sent.
+        """
+        wait = self.bucket.reserve()
+        with self._lock:
+            wait = max(wait, self._paused_until - time.monotonic())
+            self.requests_sent += 1
+            if wait > 0:
+                self.total_wait_seconds += wait
+
+        if wait > 0:
+            logger.debug(f"Pacing Etsy request for {wait:.3f}s")
+            time.sleep(wait)
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """
+        Record the quota headers of an Etsy response and adjust the pacing rate.
+        :param headers: mapping, case-insensitive response headers.
+        """
+        limit_per_second = _int_header(headers, "x-limit-per-second")
+        remaining_this_second = _int_header(headers, "x-remaining-this-second")
+
+        with self._lock:
+            self.remaining_this_second = remaining_this_second
+            self.limit_per_day = _int_header(headers, "x-limit-per-day") or self.limit_per_day
+            remaining_today = _int_header(headers, "x-remaining-today")
+            if remaining_today is not None:
+                self.remaining_today = remaining_today
+            rate_changed = bool(limit_per_second) and limit_per_second != self.limit_per_second
+            if rate_changed:
+                self.limit_per_second = limit_per_second
+
+        if rate_changed:
+            logger.info(f"Etsy per second limit changed to {limit_per_second}")
+            self.bucket.set_rate(*self._bucket_settings(limit_per_second))
+        if remaining_this_second == 0:
+            self.bucket.drain()
+        if remaining_today is not None and remaining_today < constants.ETSY_LOW_DAILY_QUOTA:
+            logger.warning(f"Etsy daily quota is running low: {remaining_today} remaining")
+
+    def throttle(self, retry_after: Optional[str]):
+        """
+        Pause all callers after Etsy responded with 429.
+        :param retry_after: str, value of the retry-after header, if any.
+        """
+        try:
+            pause = float(retry_after) if retry_after else 1.0
+        except ValueError:
+            pause = 1.0
+
+        with self._lock:
+            self.throttled_responses += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        self.bucket.drain()
+        logger.warning(f"Etsy throttled the request, pausing for {pause}s")
+
+    @property
+    def quota_state(self) -> EtsyQuotaState:
+        with self._lock:
+            return EtsyQuotaState(
+                limit_per_second=self.limit_per_second,
+                remaining_this_second=self.remaining_this_second,
+                limit_per_day=self.limit_per_day,
+                remaining_today=self.remaining_today,
+                paced_rate=self.bucket.rate,
+                requests_sent=self.requests_sent,
+                throttled_responses=self.throttled_responses,
+                total_wait_seconds=round(self.total_wait_seconds, 3),
+            )
+
+    def log_quota_state(self):
+        """
+        Log the current Etsy quota state.
+        """
+        logger.info("Etsy quota state", etsy_quota=self.quota_state.to_dict())
+
+
+def _int_header(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,119 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+http_session_pool module keeps pooled keep-alive HTTP sessions per host, shared by all clients.
+"""
+import os
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from aws_lambda_powertools import Logger
+from requests.adapters import HTTPAdapter
+
+from lazyboost.models.base_singleton import singleton
+
+logger = Logger()
+
+
+@singleton
+class HttpSessionPool:
+    """
+    Process wide registry of `requests.Session` objects, one per scheme and host.
+    The registry lives at module level, so warm Lambda invocations keep re-using the open
+    TCP/TLS connections of the previous invocation.
+    """
+
+    def __init__(self):
+        self.pool_connections = int(os.getenv("HTTP_POOL_CONNECTIONS", 4))
+        self.pool_maxsize = int(os.getenv("HTTP_POOL_MAXSIZE", 10))
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _host_key(url: str) -> str:
+        split_url = urlsplit(url)
+        return f"{split_url.scheme}://{split_url.netloc}"
+
+    def get_session(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Session:
+        """
+        Return the pooled session for the host of url, creating it on first use.
+        :param url: str, any url on the host the session is going to talk to.
+        :param headers: dict, default headers to set on the session, merged on every call.
+        :return: requests.Session, session with a keep-alive connection pool mounted.
+        """
+        host_key = self._host_key(url)
+        with self._lock:
+            session = self._sessions.get(host_key)
+            if session is None:
+                logger.debug(f"Creating pooled HTTP session for {host_key}")
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                )
+                session.mount(f"{host_key}/", adapter)
+                session.headers.update({"Connection": "keep-alive"})
+                self._sessions[host_key] = session
+
+        if headers:
+            session.headers.update(headers)
+        return session
+
+    def get_connection_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Count requests and newly opened connections per host, from the urllib3 pools.
+        Every request that did not need a new connection re-used a kept-alive one.
+        :return: dict, host to {"requests", "new_connections", "reused_connections"}.
+        """
+        stats = {}
+        with self._lock:
+            sessions = dict(self._sessions)
+
+        for host_key, session in sessions.items():
+            adapter = session.get_adapter(f"{host_key}/")
+            num_requests, num_connections = 0, 0
+            pools = adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                pool = pools.get(pool_key)
+                if pool is None:
+                    continue
+                num_requests += pool.num_requests
+                num_connections += pool.num_connections
+
+            stats[host_key] = {
+                "requests": num_requests,
+                "new_connections": num_connections,
+                "reused_connections": max(num_requests - num_connections, 0),
+            }
+        return stats
+
+    def log_connection_stats(self):
+        """
+        Log connection re-use counters for all pooled hosts.
+        """
+        logger.info("HTTP connection pool stats", connection_stats=self.get_connection_stats())
+
+    def close(self):
+        """
+        Close all pooled sessions and drop them from the registry.
+        """
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
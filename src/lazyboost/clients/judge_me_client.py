@@ -15,11 +15,15 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
 
-import requests
 from aws_lambda_powertools import Logger
 
+from lazyboost.clients.http_session_pool import HttpSessionPool
 from lazyboost.clients.secret_manager_client import SecretManagerClient
+from lazyboost.models.judge_me_model import JudgeMeReviewResult
 from lazyboost.utilities import constants
 
 logger = Logger()
@@ -34,6 +38,7 @@ class JudgeMeClient:
         self.headers = {
             "Content-Type": "application/json",
         }
+        self.session = HttpSessionPool().get_session(constants.JUDGE_ME_BASE_URL, self.headers)
 
         logger.info("Initiating JudgeMe client")
 
@@ -47,10 +52,9 @@ class JudgeMeClient:
         # TODO: change back to debug
         logger.info(f"Sending request to {request_url}, data: {review_data}")
 
-        response = requests.request(
+        response = self.session.request(
             method="POST",
             url=request_url,
-            headers=self.headers,
             data=json.dumps(review_data),
         )
 
@@ -62,3 +66,28 @@ class JudgeMeClient:
             raise ConnectionError(
                 f"Could Not Connect. Status Code: {response.status_code}: {response.reason}"
             )
+
+    def create_reviews(
+        self, reviews: List[Tuple[int, dict]], max_concurrency: int = None
+    ) -> Dict[int, JudgeMeReviewResult]:
+        """
+        Create unpublished reviews concurrently over the pooled session.
+        Judge.me offers no batch endpoint, a failing review does not affect the others.
+        :param reviews: list, (key, review data) pairs, the key identifies the review in the result.
+        :param max_concurrency: int, reviews in flight at the same time.
+        :return: dict, key to JudgeMeReviewResult, one per review.
+        """
+        max_concurrency = max_concurrency or int(
+            os.getenv("JUDGE_ME_MAX_CONCURRENCY", constants.JUDGE_ME_MAX_CONCURRENCY)
+        )
+
+        def _create(key: int, review_data: dict) -> JudgeMeReviewResult:
+            try:
+                return JudgeMeReviewResult(key, response=self.create_review(review_data))
+            except Exception as e:
+                logger.error(f"Error occurred during review creation for {key}: {e}")
+                return JudgeMeReviewResult(key, error=str(e))
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            results = executor.map(lambda review: _create(*review), reviews)
+            return {result.key: result for result in results}
@@ -16,63 +16,219 @@
 #
 import json
 import os
+import time
+import uuid
+from typing import Optional
 
 import boto3
 from aws_lambda_powertools import Logger
 from botocore.exceptions import ClientError
 
 from lazyboost.models.base_singleton import singleton
+from lazyboost.utilities import constants
 
 
 @singleton
 class SecretManagerClient:
+    """
+    Cached view of the LazyBoost secret.
+    The decoded secret is kept in memory, and optionally in an encrypted file under /tmp, for
+    SECRET_CACHE_TTL_SEC. Once the TTL is up, the cached AWSCURRENT VersionId is compared with
+    describe_secret and the value is only fetched again when the version changed.
+    Write-backs are skipped when nothing changed, and otherwise only become AWSCURRENT if
+    nobody else replaced the version they were based on.
+    """
+
     def __init__(self):
         self.client = boto3.client("secretsmanager")
         self.secret_name = os.getenv("SECRET_NAME", "LAZYBOOST_CREDS")
         self.logger = Logger()
+        self.cache_ttl = int(os.getenv("SECRET_CACHE_TTL_SEC", constants.SECRET_CACHE_TTL_SEC))
+        self.cache_path = os.getenv("SECRET_CACHE_PATH", constants.SECRET_CACHE_PATH)
+        self.cache_key = os.getenv("SECRET_CACHE_KEY")
         self.secret_variables = {}
+        self.version_id: Optional[str] = None
+        self._secret_string: Optional[str] = None
+        self._validated_at = 0.0
         self._get_value()
 
-    def get_secret_variables(self) -> dict:
-        if not self.secret_variables:
+    def get_secret_variables(self, force_refresh: bool = False) -> dict:
+        """
+        Return the secret variables, re-validating them once the cache TTL is up.
+        :param force_refresh: bool, re-validate against the AWSCURRENT version right away.
+        """
+        if force_refresh:
+            self._validated_at = 0.0
+        if not self.secret_variables or self._is_expired():
             self._get_value()
         return self.secret_variables
 
+    def _is_expired(self) -> bool:
+        return time.time() - self._validated_at >= self.cache_ttl
+
+    @staticmethod
+    def _serialize(secret_variables: dict) -> str:
+        return json.dumps(secret_variables, sort_keys=True)
+
+    def _set_value(self, secret_string: str, version_id: str, validated_at: float):
+        self.secret_variables = json.loads(secret_string)
+        self._secret_string = self._serialize(self.secret_variables)
+        self.version_id = version_id
+        self._validated_at = validated_at
+
+    def _current_version_id(self) -> Optional[str]:
+        response = self.client.describe_secret(SecretId=self.secret_name)
+        for version_id, stages in response.get("VersionIdsToStages", {}).items():
+            if "AWSCURRENT" in stages:
+                return version_id
+        return None
+
     def _get_value(self):
         """
-        Function that gets the value of a secret.
-
-        :return: The value of the secret. When the secret is a string, the value is
-                 contained in the `SecretString` field. When the secret is bytes,
-                 it is contained in the `SecretBinary` field.
+        Load the secret from the memory or file cache, re-validating it against the AWSCURRENT
+        version once its TTL is up, and fetch the value only when the version changed.
         """
+        if not self._secret_string:
+            self._load_cache_file()
+        if self._secret_string and not self._is_expired():
+            self.logger.debug(f"Using cached value for secret {self.secret_name}.")
+            return
+
         try:
-            response = self.client.get_secret_value(SecretId=self.secret_name)
-            self.logger.debug(f"Retrieved value for secret {self.secret_name}.")
+            if self._secret_string and self._current_version_id() == self.version_id:
+                self.logger.debug(f"Secret {self.secret_name} unchanged, extending the cache.")
+                self._validated_at = time.time()
+            else:
+                response = self.client.get_secret_value(SecretId=self.secret_name)
+                self.logger.debug(f"Retrieved value for secret {self.secret_name}.")
+                self._set_value(response["SecretString"], response["VersionId"], time.time())
         except ClientError:
             self.logger.exception(f"Couldn't get value for secret {self.secret_name}.")
             raise
-        else:
-            self.secret_variables = json.loads(response["SecretString"])
+        self._save_cache_file()
 
-    def update_secret_manager(self):
+    def _fernet(self):
+        """
+        Fernet cipher of the file cache, None when the file cache is not configured.
         """
-        Function that gets the value of a secret.
+        if not (self.cache_path and self.cache_key):
+            return None
+        try:
+            from cryptography.fernet import Fernet
+        except ImportError:
+            self.logger.warning("cryptography is not installed, secret file cache disabled.")
+            return None
+        return Fernet(self.cache_key)
+
+    def _load_cache_file(self):
+        fernet = self._fernet()
+        if not fernet or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "rb") as cache_file:
+                cached = json.loads(fernet.decrypt(cache_file.read()))
+            self._set_value(cached["secret_string"], cached["version_id"], cached["validated_at"])
+            self.logger.debug(f"Loaded secret {self.secret_name} from the file cache.")
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable secret cache file {self.cache_path}: {e}")
+
+    def _save_cache_file(self):
+        fernet = self._fernet()
+        if not fernet:
+            return
+        cached = {
+            "secret_string": self._secret_string,
+            "version_id": self.version_id,
+            "validated_at": self._validated_at,
+        }
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(os.open(tmp_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600), "wb") as f:
+                f.write(fernet.encrypt(json.dumps(cached).encode()))
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            self.logger.warning(f"Could not write secret cache file {self.cache_path}: {e}")
 
-        :return: The value of the secret. When the secret is a string, the value is
-                 contained in the `SecretString` field. When the secret is bytes,
-                 it is contained in the `SecretBinary` field.
+    def update_secret_manager(self) -> bool:
+        """
+        Write the secret variables back when they differ from the version they were read from.
+        The new version is staged first and then moved to AWSCURRENT from the version this
+        client is based on, which fails if another writer replaced that version meanwhile. On
+        such a conflict, the local changes are re-applied on top of the newer version and the
+        write is retried.
+        :return: bool, True if the secret holds the local values.
         """
+        for attempt in range(constants.SECRET_MAX_WRITE_RETRIES + 1):
+            secret_string = self._serialize(self.secret_variables)
+            if secret_string == self._secret_string:
+                self.logger.info(f"Secret {self.secret_name} unchanged, skipping update.")
+                return True
+
+            try:
+                if self._put_if_current(secret_string):
+                    self.logger.info(f"Successfully updated value for secret {self.secret_name}.")
+                    self._save_cache_file()
+                    return True
+            except ClientError:
+                self.logger.exception(f"Couldn't update value for secret {self.secret_name}.")
+                raise
+
+            self.logger.warning(
+                f"Secret {self.secret_name} changed concurrently, attempt {attempt + 1}"
+            )
+            self._rebase(json.loads(secret_string))
+
+        raise ConnectionError(f"Could not update secret {self.secret_name} without conflicts.")
+
+    def _put_if_current(self, secret_string: str) -> bool:
+        """
+        Compare-and-set the AWSCURRENT stage from the cached version to a new version.
+        :return: bool, False if the cached version was no longer AWSCURRENT.
+        """
+        response = self.client.put_secret_value(
+            SecretId=self.secret_name,
+            ClientRequestToken=str(uuid.uuid4()),
+            SecretString=secret_string,
+            VersionStages=[constants.SECRET_PENDING_STAGE],
+        )
+        new_version_id = response["VersionId"]
         try:
-            kwargs = {
-                "SecretId": self.secret_name,
-                "SecretString": json.dumps(self.secret_variables),
-            }
-            response = self.client.update_secret(**kwargs)
-            if response["ResponseMetadata"]["HTTPStatusCode"] == 200:
-                self.logger.info(f"Successfully updated value for secret {self.secret_name}.")
-            else:
-                self.logger.warning(f"Something went wrong while updating the secret: {response}")
-        except ClientError:
-            self.logger.exception(f"Couldn't get value for secret {self.secret_name}.")
-            raise
+            self.client.update_secret_version_stage(
+                SecretId=self.secret_name,
+                VersionStage="AWSCURRENT",
+                MoveToVersionId=new_version_id,
+                RemoveFromVersionId=self.version_id,
+            )
+            swapped = True
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "InvalidParameterException":
+                raise
+            swapped = False
+        finally:
+            self.client.update_secret_version_stage(
+                SecretId=self.secret_name,
+                VersionStage=constants.SECRET_PENDING_STAGE,
+                RemoveFromVersionId=new_version_id,
+            )
+
+        if swapped:
+            self._set_value(secret_string, new_version_id, time.time())
+        return swapped
+
+    def _reload(self):
+        response = self.client.get_secret_value(SecretId=self.secret_name)
+        self._set_value(response["SecretString"], response["VersionId"], time.time())
+        self._save_cache_file()
+
+    def _rebase(self, local_variables: dict):
+        """
+        Re-read the secret and re-apply the keys changed locally on top of it.
+        """
+        base_variables = json.loads(self._secret_string)
+        changed = {k: v for k, v in local_variables.items() if base_variables.get(k) != v}
+        removed = [k for k in base_variables if k not in local_variables]
+
+        self._reload()
+        for key in removed:
+            self.secret_variables.pop(key, None)
+        self.secret_variables.update(changed)
@@ -17,27 +17,117 @@
 
 import json
 import os
+import time
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-import shopify
 from aws_lambda_powertools import Logger
 
+from lazyboost.clients.http_session_pool import HttpSessionPool
 from lazyboost.clients.secret_manager_client import SecretManagerClient
+from lazyboost.clients.shopify_cost_governor import ShopifyCostGovernor
+from lazyboost.clients.shopify_graphql_transport import ShopifyGraphQLTransport
 from lazyboost.models.base_singleton import singleton
 from lazyboost.models.etsy_buyer_model import EtsyBuyer
 from lazyboost.models.etsy_order import EtsyOrder
 from lazyboost.models.shopify_customer_model import ShopifyCustomer
-from lazyboost.models.shopify_product_model import ShopifyListing, ShopifyMinimalProduct
+from lazyboost.models.shopify_order_model import (
+    ShopifyOrderResult,
+    to_order_create_input,
+)
+from lazyboost.models.shopify_product_model import (
+    ShopifyListing,
+    ShopifyMinimalProduct,
+    ShopifySkuInfo,
+)
+from lazyboost.utilities import constants
+from lazyboost.utilities.ttl_cache import TTLCache
+from lazyboost.utilities.utility_generic import parse_gid
 
 logger = Logger()
 
+VARIANT_PAGE_FRAGMENT = """
+fragment variantPage on ProductVariantConnection {
+  pageInfo {
+    hasNextPage
+    endCursor
+  }
+  edges {
+    node {
+      id
+      price
+      sku
+      inventoryQuantity
+      updatedAt
+      metafields(first: 1, namespace: $lzNamespace) {
+        edges {
+          node {
+            namespace
+            key
+            value
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+# bulk operations flatten nested connections into JSONL rows linked by __parentId
+BULK_PRODUCTS_QUERY = """
+{
+  products(query: "status:ACTIVE") {
+    edges {
+      node {
+        id
+        title
+        description
+        productType
+        status
+        updatedAt
+        totalInventory
+        tags
+        metafields(namespace: "lazyboost") {
+          edges {
+            node {
+              namespace
+              key
+              value
+            }
+          }
+        }
+        variants {
+          edges {
+            node {
+              id
+              price
+              sku
+              inventoryQuantity
+              updatedAt
+              metafields(namespace: "lazyboost") {
+                edges {
+                  node {
+                    namespace
+                    key
+                    value
+                  }
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
 
 @singleton
 class ShopifyClient:
     def __init__(self):
         self.sm_client = SecretManagerClient()
-        self.api_version = "2024-01"
+        self.api_version = "2025-01"
         self.is_test_mode = True if os.getenv("SHOPIFY_TEST_MODE", "").lower() == "true" else False
 
         if self.is_test_mode:
@@ -51,171 +141,398 @@ class ShopifyClient:
             self.client_secret = self.sm_client.secret_variables["SHOPIFY_AFD_SECRET_KEY"]
             self.access_token = self.sm_client.secret_variables["SHOPIFY_AFD_ACCESS_TOKEN"]
 
-        logger.info("Initiating Shopify session")
-        self.session = shopify.Session(self.shop_url, self.api_version, self.access_token)
-        shopify.ShopifyResource.activate_session(self.session)
+        logger.info("Initiating Shopify GraphQL transport")
+        self.transport = ShopifyGraphQLTransport(self.shop_url, self.api_version, self.access_token)
 
-    def __del__(self):
-        logger.debug("Clearing shopify session")
-        shopify.ShopifyResource.clear_session()
+        # SKU -> variant mappings rarely change, keep them across warm invocations
+        self.sku_cache = TTLCache(
+            max_size=int(os.getenv("SHOPIFY_SKU_CACHE_SIZE", 2048)),
+            ttl=int(os.getenv("SHOPIFY_SKU_CACHE_TTL_SEC", 6 * 60 * 60)),
+            negative_ttl=int(os.getenv("SHOPIFY_SKU_CACHE_NEGATIVE_TTL_SEC", 5 * 60)),
+            persist_path=os.getenv("SHOPIFY_SKU_CACHE_PATH", constants.SHOPIFY_SKU_CACHE_PATH),
+        )
+        self.sku_cache.load(ShopifySkuInfo.from_cache_dict)
+        self.cost_governor = ShopifyCostGovernor()
 
     @property
     def shopify_domain(self) -> str:
-        return self.session.url
-
-    def is_existing_customer(self, etsy_buyer: EtsyBuyer) -> Optional[ShopifyCustomer]:
-        logger.debug(f"Attempting to find customer by tag: {etsy_buyer.etsy_tag}")
-        response = shopify.Customer.search(session=self.session, query=f"tag:{etsy_buyer.etsy_tag}")
-        if not response:
-            logger.debug("Attempting to find customer by name")
-            try:
-                (buyer_name1, buyer_name2) = etsy_buyer.name.rsplit(" ", 1)
-            except ValueError:
-                (buyer_name1, buyer_name2) = (etsy_buyer.name, "")
-            response = shopify.Customer.search(
-                session=self.session,
-                query=f"first_name:{buyer_name1} last_name:{buyer_name2} address1:{etsy_buyer.address_first_line}",
-            )
-        if not response:
-            return None
-        return ShopifyCustomer.from_dict(response[0].attributes)
-
-    def update_customer(self, etsy_buyer: EtsyBuyer, shopify_customer: ShopifyCustomer) -> None:
-        default_address = shopify_customer.default_address
+        return self.transport.shop_domain
 
-        is_existing_address = None
-        if default_address:
-            # default_address will be None for customers that failed with Lambda timeout
-            is_existing_address = default_address.is_billing_address_same(etsy_buyer)
-
-        if not is_existing_address:
-            for address in shopify_customer.addresses:
-                if address.is_billing_address_same(etsy_buyer):
-                    res = shopify.Customer.put(
-                        f"{shopify_customer.id}/addresses/{address.id}/default",
-                        body=json.dumps(
-                            {
-                                "address_id": address.id,
-                                "customer_id": shopify_customer.id,
-                            }
-                        ).encode("utf-8"),
-                    )
-                    logger.info(
-                        f"updating customer: {shopify_customer.id} default address: {res.code}"
-                    )
-                    is_existing_address = True
-                    break
-
-        # Address not found in any existing addresses
-        if not is_existing_address:
-            self.add_customer_address(etsy_buyer, shopify_customer.id)
-
-        # if etsy buyer tag is not in tags, add it
-        if etsy_buyer.etsy_tag not in shopify_customer.tags:
-            _tags = shopify_customer.tags.split(",")
-            _tags.append(etsy_buyer.etsy_tag)
-            shopify.Customer.put(
-                f"{shopify_customer.id}",
-                body=json.dumps(
-                    {"customer": {"id": shopify_customer.id, "tags": ",".join(filter(None, _tags))}}
-                ).encode("utf-8"),
-            )
-
-    def add_customer_address(self, etsy_buyer: EtsyBuyer, shopify_customer_id: int) -> None:
-        logger.info(f"Adding new address for {shopify_customer_id}")
-
-        response = shopify.Customer.post(
-            f"{shopify_customer_id}/addresses",
-            body=json.dumps({"address": etsy_buyer.to_shopify_address()}).encode("utf-8"),
+    def _execute_graphql(self, query_name: str, query: str, variables: dict = None) -> dict:
+        """
+        Execute a GraphQL query through the cost governor and parse the response once.
+        :param query_name: str, name the query cost is tracked under.
+        :param query: str, GraphQL query or mutation.
+        :param variables: dict, variables of the query.
+        :return: dict, parsed GraphQL response.
+        """
+        return self.cost_governor.execute(
+            query_name,
+            lambda: self.transport.execute(query, variables),
         )
-        logger.debug(f"update customer response: {response}")
 
-    def create_customer(self, etsy_buyer: EtsyBuyer) -> int:
-        logger.info(f"Creating a new customer for {etsy_buyer}")
+    def _governed_batches(self, items: List, max_size: int, cost_per_item: float) -> Iterator[List]:
+        """
+        Split items into batches, shrinking each batch to what the cost bucket can afford.
+        """
+        start = 0
+        while start < len(items):
+            size = self.cost_governor.affordable_size(max_size, cost_per_item)
+            yield items[start : start + size]
+            start += size
+
+    def is_existing_customer(self, etsy_buyer: EtsyBuyer) -> Optional[ShopifyCustomer]:
+        """
+        Find a returning buyer by their Etsy buyer tag, or by name and address, in one query.
+        The tag match wins when both strategies find a customer.
+        """
         try:
             (buyer_name1, buyer_name2) = etsy_buyer.name.rsplit(" ", 1)
         except ValueError:
             (buyer_name1, buyer_name2) = (etsy_buyer.name, "")
-        new_customer = shopify.Customer()
-        new_customer.first_name = buyer_name1
-        new_customer.last_name = buyer_name2
-        if etsy_buyer.email:
-            new_customer.email = etsy_buyer.email
-            new_customer.verified_email = True
-            new_customer.send_email_welcome: False
-        new_customer.tags = etsy_buyer.etsy_tag
-        new_customer.save()
-
-        logger.info(f"add new customer response: {new_customer.id}")
-        self.add_customer_address(etsy_buyer, new_customer.id)
-        return new_customer.id
-
-    def get_product_id(self, product_sku: str):
-        res = shopify.GraphQL().execute(
+
+        logger.debug(f"Attempting to find customer by tag: {etsy_buyer.etsy_tag} or by name")
+        response_dict = self._execute_graphql(
+            "is_existing_customer",
             query="""
-            query($filter: String!) {
-              productVariants(first: 1, query: $filter) {
+            query($tagFilter: String!, $nameFilter: String!) {
+              byTag: customers(first: 1, query: $tagFilter) {
                 edges {
                   node {
-                    id
+                    ...matchedCustomer
+                  }
+                }
+              }
+              byName: customers(first: 1, query: $nameFilter) {
+                edges {
+                  node {
+                    ...matchedCustomer
                   }
                 }
               }
             }
+
+            fragment matchedCustomer on Customer {
+              id
+              tags
+              defaultAddress {
+                ...matchedAddress
+              }
+              addresses {
+                ...matchedAddress
+              }
+            }
+
+            fragment matchedAddress on MailingAddress {
+              id
+              firstName
+              lastName
+              company
+              address1
+              address2
+              city
+              provinceCode
+              countryCodeV2
+              zip
+              phone
+            }
             """,
-            variables={"filter": f"sku:{product_sku}"},
+            variables={
+                "tagFilter": f"tag:{etsy_buyer.etsy_tag}",
+                "nameFilter": (
+                    f'first_name:"{buyer_name1}" last_name:"{buyer_name2}" '
+                    f'address1:"{etsy_buyer.address_first_line}"'
+                ),
+            },
         )
 
-        response_dict: dict = json.loads(res)
         if "errors" in response_dict.keys() and response_dict["errors"]:
-            logger.error("Failed to get product variant", error=response_dict)
+            logger.error("Failed to search customers", error=response_dict)
+            raise ConnectionError(f"Could not search customers: {response_dict['errors']}")
+
+        for match in ("byTag", "byName"):
+            edges = response_dict["data"][match]["edges"]
+            if edges:
+                logger.debug(f"Customer matched {match}")
+                return ShopifyCustomer.from_graphql(edges[0]["node"])
+        return None
+
+    def upsert_customer(
+        self, etsy_buyer: EtsyBuyer, shopify_customer: Optional[ShopifyCustomer]
+    ) -> int:
+        """
+        Bring the Shopify customer of an Etsy buyer to its desired state.
+        A new buyer is created with their Etsy tag and address. A returning buyer gets the Etsy
+        tag added, and the billing address set as default, creating it when no existing address
+        matches. Only what changed is written, the other addresses are left untouched.
+        :param etsy_buyer: EtsyBuyer, buyer of the order.
+        :param shopify_customer: ShopifyCustomer, matched returning customer, None for a new one.
+        :return: int, Shopify customer id.
+        """
+        if not shopify_customer:
+            return self._create_customer(etsy_buyer)
+
+        tags = [t.strip() for t in shopify_customer.tags.split(",") if t.strip()]
+        if etsy_buyer.etsy_tag not in tags:
+            logger.info(f"Tagging customer: {shopify_customer.id}")
+            self._customer_mutation(
+                "customerUpdate",
+                {
+                    "id": f"gid://shopify/Customer/{shopify_customer.id}",
+                    "tags": tags + [etsy_buyer.etsy_tag],
+                },
+            )
+
+        default_address = shopify_customer.default_address
+        # default_address will be None for customers that failed with Lambda timeout
+        if default_address and default_address.is_billing_address_same(etsy_buyer):
+            logger.info(f"Customer {shopify_customer.id} address is up to date")
+            return shopify_customer.id
+
+        matched = next(
+            (a for a in shopify_customer.addresses if a.is_billing_address_same(etsy_buyer)),
+            None,
+        )
+        if matched:
+            logger.info(f"Setting address {matched.id} as default for {shopify_customer.id}")
+            self._address_mutation(
+                "customerUpdateDefaultAddress",
+                "$customerId: ID!, $addressId: ID!",
+                "customerId: $customerId, addressId: $addressId",
+                {
+                    "customerId": f"gid://shopify/Customer/{shopify_customer.id}",
+                    "addressId": matched.gid,
+                },
+            )
         else:
-            products = json.loads(res)["data"]["productVariants"]["edges"]
-            logger.info(f"Product found: {products}")
-            return products[0]["node"]["id"].rsplit("/", 1)[-1]
+            logger.info(f"Adding new default address for {shopify_customer.id}")
+            self._address_mutation(
+                "customerAddressCreate",
+                "$customerId: ID!, $address: MailingAddressInput!",
+                "customerId: $customerId, address: $address, setAsDefault: true",
+                {
+                    "customerId": f"gid://shopify/Customer/{shopify_customer.id}",
+                    "address": etsy_buyer.to_shopify_address_input(),
+                },
+            )
+        return shopify_customer.id
 
-    def get_product_info(self, product_sku: str):
-        res = shopify.GraphQL().execute(
-            query="""
-            query($filter: String!) {
-              productVariants(first: 1, query: $filter) {
-                edges {
-                  node {
-                    id
-                    product {
-                      id
-                      title
-                      onlineStoreUrl
-                      handle
-                      featuredImage {
-                        url
+    def _create_customer(self, etsy_buyer: EtsyBuyer) -> int:
+        logger.info(f"Creating a new customer for {etsy_buyer}")
+        try:
+            (buyer_name1, buyer_name2) = etsy_buyer.name.rsplit(" ", 1)
+        except ValueError:
+            (buyer_name1, buyer_name2) = (etsy_buyer.name, "")
+
+        customer_input = {
+            "firstName": buyer_name1,
+            "lastName": buyer_name2,
+            "tags": [etsy_buyer.etsy_tag],
+            "addresses": [etsy_buyer.to_shopify_address_input()],
+        }
+        if etsy_buyer.email:
+            customer_input["email"] = etsy_buyer.email
+
+        customer_id = self._customer_mutation("customerCreate", customer_input)
+        logger.info(f"add new customer response: {customer_id}")
+        return customer_id
+
+    def _customer_mutation(self, mutation: str, customer_input: dict) -> int:
+        response_dict = self._execute_graphql(
+            mutation,
+            query=f"""
+            mutation($input: CustomerInput!) {{
+              result: {mutation}(input: $input) {{
+                customer {{
+                  id
+                }}
+                userErrors {{
+                  field
+                  message
+                }}
+              }}
+            }}
+            """,
+            variables={"input": customer_input},
+        )
+        if "errors" in response_dict.keys() and response_dict["errors"]:
+            raise ConnectionError(f"Could not run {mutation}: {response_dict['errors']}")
+
+        result = response_dict["data"]["result"]
+        if result["userErrors"]:
+            raise ValueError(f"{mutation} failed: {result['userErrors']}")
+        return parse_gid(result["customer"]["id"])
+
+    def _address_mutation(self, mutation: str, arguments: str, inputs: str, variables: dict):
+        response_dict = self._execute_graphql(
+            mutation,
+            query=f"""
+            mutation({arguments}) {{
+              result: {mutation}({inputs}) {{
+                userErrors {{
+                  field
+                  message
+                }}
+              }}
+            }}
+            """,
+            variables=variables,
+        )
+        if "errors" in response_dict.keys() and response_dict["errors"]:
+            raise ConnectionError(f"Could not run {mutation}: {response_dict['errors']}")
+        if response_dict["data"]["result"]["userErrors"]:
+            raise ValueError(f"{mutation} failed: {response_dict['data']['result']['userErrors']}")
+
+    def resolve_skus(self, product_skus: Iterable[str]) -> Dict[str, ShopifySkuInfo]:
+        """
+        Resolve SKUs to their variant and product with as few GraphQL requests as possible.
+        Cached SKUs are served from the read-through SKU cache, the remaining ones are OR'd into a
+        single productVariants filter, SHOPIFY_SKU_BATCH_SIZE per request.
+        :param product_skus: iterable, SKUs to resolve.
+        :return: dict, SKU to ShopifySkuInfo, with a not found entry for every unknown SKU.
+                 SKUs of a request that failed are left out.
+        """
+        resolved = {}
+        skus_to_fetch = []
+        for sku in sorted({sku for sku in product_skus if sku}):
+            is_cached, sku_info = self.sku_cache.get(sku)
+            if is_cached:
+                resolved[sku] = sku_info or ShopifySkuInfo.not_found(sku)
+            else:
+                skus_to_fetch.append(sku)
+
+        # each SKU requests two variant nodes, each costing the node, its product and image
+        for batch in self._governed_batches(skus_to_fetch, constants.SHOPIFY_SKU_BATCH_SIZE, 6):
+            fetched = self._resolve_sku_batch(batch)
+            for sku, sku_info in fetched.items():
+                self.sku_cache.put(sku, sku_info, negative=not sku_info.found)
+            resolved.update(fetched)
+
+        if skus_to_fetch:
+            self.sku_cache.save(ShopifySkuInfo.to_cache_dict)
+        logger.debug("SKU cache stats", sku_cache=self.sku_cache.stats)
+        return resolved
+
+    def _invalidate_skus(self, skus: Iterable[str]):
+        """
+        Drop updated SKUs from the SKU cache, and from its file, so the next process does not
+        reload a stale variant.
+        """
+        invalidated = [sku for sku in skus if self.sku_cache.invalidate(sku)]
+        if invalidated:
+            self.sku_cache.save(ShopifySkuInfo.to_cache_dict)
+            logger.debug(f"Invalidated cached SKUs: {invalidated}")
+
+    def _resolve_sku_batch(self, skus: List[str]) -> Dict[str, ShopifySkuInfo]:
+        """
+        Resolve a batch of SKUs, following the variants cursor until every SKU has an exact
+        match or the search is exhausted. The sku filter also matches similar SKUs, so only an
+        exhausted search reports a SKU not found. SKUs still unmatched after
+        SHOPIFY_SKU_MAX_PAGES pages are left out, and are not cached as misses.
+        """
+        sku_filter = " OR ".join('sku:"{}"'.format(sku.replace('"', '\\"')) for sku in skus)
+        resolved = {}
+        cursor = None
+        for _ in range(constants.SHOPIFY_SKU_MAX_PAGES):
+            response_dict = self._execute_graphql(
+                "resolve_skus",
+                query="""
+                query($filter: String!, $first: Int!, $after: String) {
+                  productVariants(first: $first, after: $after, query: $filter) {
+                    pageInfo {
+                      hasNextPage
+                      endCursor
+                    }
+                    edges {
+                      node {
+                        id
+                        sku
+                        product {
+                          id
+                          title
+                          onlineStoreUrl
+                          handle
+                          featuredImage {
+                            url
+                          }
+                        }
                       }
                     }
                   }
                 }
-              }
-            }
-            """,
-            variables={"filter": f"sku:{product_sku}"},
-        )
+                """,
+                # room for a few SKUs shared by more than one variant
+                variables={
+                    "filter": sku_filter,
+                    "first": min(len(skus) * 2, 250),
+                    "after": cursor,
+                },
+            )
 
-        response_dict: dict = json.loads(res)
-        if "errors" in response_dict.keys() and response_dict["errors"]:
-            logger.error("Failed to get product info", error=response_dict)
+            if "errors" in response_dict.keys() and response_dict["errors"]:
+                logger.error("Failed to resolve product variants", error=response_dict)
+                return resolved
+
+            variants = response_dict["data"]["productVariants"]
+            for edge in variants["edges"]:
+                sku_info = ShopifySkuInfo.from_dict(edge["node"])
+                if sku_info.sku in skus and sku_info.sku not in resolved:
+                    resolved[sku_info.sku] = sku_info
+
+            if len(resolved) == len(skus):
+                break
+            if not variants["pageInfo"]["hasNextPage"]:
+                resolved.update(
+                    {sku: ShopifySkuInfo.not_found(sku) for sku in skus if sku not in resolved}
+                )
+                break
+            cursor = variants["pageInfo"]["endCursor"]
         else:
-            products = json.loads(res)["data"]["productVariants"]["edges"]
-            logger.debug(f"Product found: {products}")
-            if products:
-                return ShopifyMinimalProduct.from_dict(products[0]["node"]["product"])
-            else:
-                return None
+            logger.warning(
+                f"SKU search truncated after {constants.SHOPIFY_SKU_MAX_PAGES} pages",
+                unresolved=[sku for sku in skus if sku not in resolved],
+            )
+
+        logger.info(
+            f"Resolved {sum(i.found for i in resolved.values())} of {len(skus)} SKUs",
+            not_found=[sku for sku, i in resolved.items() if not i.found],
+        )
+        return resolved
+
+    def get_product_id(self, product_sku: str) -> Optional[str]:
+        sku_info = self.resolve_skus([product_sku]).get(product_sku)
+        return sku_info.variant_id if sku_info else None
+
+    def get_product_info(self, product_sku: str) -> Optional[ShopifyMinimalProduct]:
+        sku_info = self.resolve_skus([product_sku]).get(product_sku)
+        return sku_info.product if sku_info else None
 
     def get_new_products(self, timestamp_to_check: datetime) -> List[ShopifyListing]:
+        return list(self.iter_new_products(timestamp_to_check))
+
+    def iter_new_products(self, timestamp_to_check: datetime) -> Iterator[ShopifyListing]:
+        """
+        Iterate over active products updated after timestamp_to_check, following the products
+        cursor page by page, and the variants cursor of products with more variants than fit
+        in the first page. The products page size adapts to the cost reported for the previous
+        page and to the points available in the cost bucket.
+        :param timestamp_to_check: datetime, lower bound of the product update time.
+        :raises ConnectionError: if a page could not be retrieved.
+        """
         timestamp = timestamp_to_check.strftime("%Y-%m-%dT%H:%M:%SZ")
-        res = shopify.GraphQL().execute(
-            query="""
-                query($filter: String!, $lzNamespace: String!) {
-                  products(first: 10, query: $filter) {
+        cursor = None
+        page_size = self._max_product_page_size()
+        while True:
+            response_dict = self._execute_graphql(
+                "get_new_products",
+                query="""
+                query($filter: String!, $lzNamespace: String!, $first: Int!, $after: String,
+                      $variantsFirst: Int!) {
+                  products(first: $first, after: $after, query: $filter) {
+                    pageInfo {
+                      hasNextPage
+                      endCursor
+                    }
                     edges {
                       node {
                         id
@@ -234,128 +551,364 @@ class ShopifyClient:
                             }
                           }
                         }
-                        variants(first: 10) {
-                          edges {
-                            node {
-                              id
-                              price
-                              sku
-                              inventoryQuantity
-                              updatedAt
-                              metafields(first: 1, namespace: $lzNamespace) {
-                                edges {
-                                  node {
-                                    namespace
-                                    key
-                                    value
-                                  }
-                                }
-                              }
-                            }
-                          }
+                        variants(first: $variantsFirst) {
+                          ...variantPage
                         }
                       }
                     }
                   }
                 }
-                """,
-            variables={
-                "filter": f"status:ACTIVE AND updated_at:>{timestamp}",
-                "lzNamespace": "lazyboost",
-            },
+                """
+                + VARIANT_PAGE_FRAGMENT,
+                variables={
+                    "filter": f"status:ACTIVE AND updated_at:>{timestamp}",
+                    "lzNamespace": "lazyboost",
+                    "first": page_size,
+                    "after": cursor,
+                    "variantsFirst": constants.SHOPIFY_VARIANT_PAGE_SIZE,
+                },
+            )
+
+            if "errors" in response_dict.keys() and response_dict["errors"]:
+                logger.error("Failed to get products", error=response_dict)
+                # ending the stream here would pass for a sync without updated products
+                raise ConnectionError(f"Could not get products: {response_dict['errors']}")
+
+            products_page = response_dict["data"]["products"]
+            for edge in products_page["edges"]:
+                product_node = edge["node"]
+                self._fetch_remaining_variants(product_node)
+                product = ShopifyListing.from_dict(product_node)
+                self._invalidate_skus(variant.sku for variant in product.variants)
+                logger.debug(f"Product found: {product}")
+                yield product
+
+            if not products_page["pageInfo"]["hasNextPage"]:
+                return
+            cursor = products_page["pageInfo"]["endCursor"]
+            page_size = self._next_product_page_size(response_dict, page_size)
+
+    @staticmethod
+    def _max_product_page_size() -> int:
+        """
+        Largest products page whose requested cost stays within SHOPIFY_MAX_QUERY_COST.
+        A connection requests 2 points plus its nodes, every object requests 1 point.
+        """
+        variant_cost = 1 + (2 + 1)
+        product_cost = 1 + (2 + 1) + 2 + constants.SHOPIFY_VARIANT_PAGE_SIZE * variant_cost
+        max_page_size = (constants.SHOPIFY_MAX_QUERY_COST - 2) // product_cost
+        return max(1, min(constants.SHOPIFY_PRODUCT_PAGE_SIZE, max_page_size))
+
+    def _next_product_page_size(self, response_dict: dict, page_size: int) -> int:
+        cost = (response_dict.get("extensions") or {}).get("cost") or {}
+        requested_cost = cost.get("requestedQueryCost")
+        if not requested_cost:
+            return page_size
+
+        cost_per_product = max(float(requested_cost) / page_size, 1.0)
+        # a single query may never request more than the bucket can hold
+        max_page_size = int(self.cost_governor.maximum_available // cost_per_product)
+        return self.cost_governor.affordable_size(
+            min(self._max_product_page_size(), max_page_size), cost_per_product
         )
 
-        response_dict: dict = json.loads(res)
+    def _fetch_remaining_variants(self, product_node: dict):
+        """
+        Follow the variants cursor of a product node, appending the remaining variant edges.
+        """
+        variants = product_node["variants"]
+        while variants["pageInfo"]["hasNextPage"]:
+            response_dict = self._execute_graphql(
+                "get_product_variants",
+                query="""
+                query($id: ID!, $lzNamespace: String!, $first: Int!, $after: String) {
+                  product(id: $id) {
+                    variants(first: $first, after: $after) {
+                      ...variantPage
+                    }
+                  }
+                }
+                """
+                + VARIANT_PAGE_FRAGMENT,
+                variables={
+                    "id": product_node["id"],
+                    "lzNamespace": "lazyboost",
+                    "first": constants.SHOPIFY_VARIANT_PAGE_SIZE,
+                    "after": variants["pageInfo"]["endCursor"],
+                },
+            )
+            if "errors" in response_dict.keys() and response_dict["errors"]:
+                logger.error("Failed to get product variants", error=response_dict)
+                raise ConnectionError(f"Could not get variants of product {product_node['id']}")
+
+            next_variants = response_dict["data"]["product"]["variants"]
+            variants["edges"].extend(next_variants["edges"])
+            variants["pageInfo"] = next_variants["pageInfo"]
+
+    def iter_all_products_bulk(self) -> Iterator[ShopifyListing]:
+        """
+        Export every active product with its variants and lazyboost metafields through a
+        Shopify bulk operation. The resulting JSONL file is streamed line by line and only the
+        product currently being reassembled is held in memory.
+        """
+        bulk_operation_id = self._run_bulk_query(BULK_PRODUCTS_QUERY)
+        result_url = self._wait_for_bulk_operation(bulk_operation_id)
+        if not result_url:
+            logger.info("Bulk operation returned no products")
+            return
+
+        session = HttpSessionPool().get_session(result_url)
+        with session.get(result_url, stream=True) as response:
+            response.raise_for_status()
+            rows = (json.loads(line) for line in response.iter_lines() if line)
+            for product in self._assemble_bulk_products(rows):
+                self._invalidate_skus(variant.sku for variant in product.variants)
+                yield product
+
+    def _run_bulk_query(self, bulk_query: str) -> str:
+        response_dict = self._execute_graphql(
+            "bulk_operation_run_query",
+            query="""
+            mutation($query: String!) {
+              bulkOperationRunQuery(query: $query) {
+                bulkOperation {
+                  id
+                  status
+                }
+                userErrors {
+                  field
+                  message
+                }
+              }
+            }
+            """,
+            variables={"query": bulk_query},
+        )
         if "errors" in response_dict.keys() and response_dict["errors"]:
-            logger.error("Failed to get products", error=response_dict)
-            return []
+            raise ConnectionError(f"Could not start bulk operation: {response_dict['errors']}")
 
-        logger.info("Query cost for get_new_products", cost=response_dict["extensions"]["cost"])
+        result = response_dict["data"]["bulkOperationRunQuery"]
+        if result["userErrors"]:
+            raise ValueError(f"Bulk operation rejected: {result['userErrors']}")
 
-        raw_products = json.loads(res)["data"]["products"]["edges"]
-        products = [ShopifyListing.from_dict(p["node"]) for p in raw_products]
-        logger.debug(f"Products found: {products}")
-        return products
+        logger.info(f"Started bulk operation {result['bulkOperation']['id']}")
+        return result["bulkOperation"]["id"]
 
-    def does_order_exist(self, receipt_id: int) -> str:
-        res = shopify.GraphQL().execute(
+    def _wait_for_bulk_operation(self, bulk_operation_id: str) -> Optional[str]:
+        """
+        Poll the current bulk operation until it finishes.
+        :return: str, url of the JSONL result, None if the export is empty.
+        """
+        poll_interval = float(os.getenv("SHOPIFY_BULK_POLL_INTERVAL_SEC", 2))
+        deadline = time.monotonic() + float(os.getenv("SHOPIFY_BULK_TIMEOUT_SEC", 600))
+        while time.monotonic() < deadline:
+            response_dict = self._execute_graphql(
+                "current_bulk_operation",
+                query="""
+                query {
+                  currentBulkOperation {
+                    id
+                    status
+                    errorCode
+                    objectCount
+                    url
+                  }
+                }
+                """,
+            )
+            if "errors" in response_dict.keys() and response_dict["errors"]:
+                raise ConnectionError(f"Could not poll bulk operation: {response_dict['errors']}")
+
+            operation = response_dict["data"]["currentBulkOperation"]
+            if operation["id"] != bulk_operation_id:
+                raise ValueError(f"Bulk operation {bulk_operation_id} is no longer current")
+
+            if operation["status"] == "COMPLETED":
+                logger.info(f"Bulk operation completed with {operation['objectCount']} objects")
+                return operation["url"]
+            if operation["status"] not in ("CREATED", "RUNNING"):
+                raise ValueError(
+                    f"Bulk operation ended with {operation['status']}: {operation['errorCode']}"
+                )
+
+            logger.debug(f"Bulk operation {operation['status']}: {operation['objectCount']}")
+            time.sleep(poll_interval)
+
+        raise TimeoutError(f"Bulk operation {bulk_operation_id} did not complete in time")
+
+    @staticmethod
+    def _assemble_bulk_products(rows: Iterator[dict]) -> Iterator[ShopifyListing]:
+        """
+        Rebuild products from bulk operation rows. Shopify writes every child after its parent
+        product, so a product is complete as soon as the next product row shows up, and only
+        that product is held in memory. Child rows are attached by __parentId, rows whose
+        parent is not the current product or one of its variants are logged and skipped.
+        """
+        product = None
+        variants_by_id = {}
+        for row in rows:
+            parent_id = row.pop("__parentId", None)
+            if parent_id is None:
+                if product:
+                    yield ShopifyListing.from_dict(product)
+                product = dict(row, metafields={"edges": []}, variants={"edges": []})
+                variants_by_id = {}
+                continue
+
+            if product and parent_id == product["id"]:
+                parent = product
+            else:
+                parent = variants_by_id.get(parent_id)
+            if parent is None:
+                logger.warning(f"Skipping bulk row {row.get('id')} of unknown parent {parent_id}")
+            elif "namespace" in row:
+                parent["metafields"]["edges"].append({"node": row})
+            elif parent is product:
+                variant = dict(row, metafields={"edges": []})
+                variants_by_id[variant["id"]] = variant
+                product["variants"]["edges"].append({"node": variant})
+            else:
+                logger.warning(f"Skipping bulk row {row.get('id')} nested in variant {parent_id}")
+
+        if product:
+            yield ShopifyListing.from_dict(product)
+
+    def existing_orders(self, receipt_ids: Iterable[int]) -> Dict[int, str]:
+        """
+        Find the Shopify orders already created for Etsy receipts.
+        Receipt tags are OR'd into a single orders filter, SHOPIFY_ORDER_TAG_BATCH_SIZE per request.
+        :param receipt_ids: iterable, Etsy receipt ids to check.
+        :return: dict, receipt id to Shopify order id, only for receipts that have an order.
+        """
+        receipt_ids = sorted(set(receipt_ids))
+        existing = {}
+        # each receipt requests two order nodes
+        for batch in self._governed_batches(receipt_ids, constants.SHOPIFY_ORDER_TAG_BATCH_SIZE, 2):
+            existing.update(self._existing_orders_batch(batch))
+        return existing
+
+    def _existing_orders_batch(self, receipt_ids: List[int]) -> Dict[int, str]:
+        tags_by_receipt = {f"ETSY_{receipt_id}": receipt_id for receipt_id in receipt_ids}
+        response_dict = self._execute_graphql(
+            "existing_orders",
             query="""
-            query($filter: String!) {
-              orders(first: 1, query: $filter) {
+            query($filter: String!, $first: Int!) {
+              orders(first: $first, query: $filter) {
                 edges {
                   node {
                     id
+                    tags
                   }
                 }
               }
             }
             """,
-            variables={"filter": f"tag:ETSY_{receipt_id}"},
+            variables={
+                "filter": " OR ".join(f"tag:{tag}" for tag in tags_by_receipt),
+                "first": min(len(receipt_ids) * 2, 250),
+            },
         )
-        orders_found = json.loads(res)["data"]["orders"]["edges"]
-        return orders_found[0]["node"]["id"].rsplit("/", 1)[-1] if orders_found else ""
-
-    def create_order(self, etsy_order: EtsyOrder, customer_id):
-        logger.info(f"Creating a new shopify order for customer: {customer_id}")
-        new_order = shopify.Order.create(
-            {
-                "email": etsy_order.buyer.email,
-                "billing_address": etsy_order.buyer.to_shopify_address(),
-                "customer": {"id": customer_id},
-                "inventory_behaviour": "decrement_obeying_policy",
-                "financial_status": "paid",
-                "fulfillment_status": None,
-                "line_items": [
-                    {
-                        "variant_id": self.get_product_id(t.product_sku),
-                        "sku": t.product_sku,
-                        "quantity": t.product_quantity,
-                        "requires_shipping": True,
-                        "price": t.product_price,
-                        "properties": (
-                            {"message": etsy_order.message_from_buyer}
-                            if etsy_order.message_from_buyer
-                            else []
-                        ),
-                    }
-                    for t in etsy_order.transactions
-                ],
-                "note": f"Gift Message: {etsy_order.gift_message}" if etsy_order.is_gift else "",
-                "send_receipt": True,
-                "shipping_address": etsy_order.buyer.to_shopify_address(),
-                "shipping_lines": [
-                    {
-                        "title": "Standard Shipping",
-                        "price": etsy_order.sale_shipping_cost,
-                    }
-                ],
-                "source_name": "Etsy",
-                "source_identifier": etsy_order.receipt_id,
-                "subtotal_price": etsy_order.sale_subtotal_cost,
-                "tags": f"LazyBoost, ETSY_{etsy_order.receipt_id}",
-                "tax_lines": [
-                    {
-                        "title": "Etsy Sales Tax",
-                        "price": etsy_order.sale_tax_cost,
-                        "rate": round(etsy_order.sale_tax_cost / etsy_order.sale_subtotal_cost, 2),
-                        "channel_liable": None,
-                    }
-                ],
-                "total_discounts": etsy_order.sale_discount_cost,
-                "total_price": etsy_order.sale_total_cost,
-                "total_tax": etsy_order.sale_tax_cost,
-                "transactions": [
-                    {
-                        "amount": etsy_order.sale_total_cost,
-                        "currency": "USD",
-                        "kind": "capture",
-                        "status": "success",
-                        "gateway": "Etsy Checkout",
-                    }
-                ],
-            }
+
+        if "errors" in response_dict.keys() and response_dict["errors"]:
+            logger.error("Failed to check existing orders", error=response_dict)
+            raise ConnectionError(f"Could not check existing orders: {response_dict['errors']}")
+
+        existing = {}
+        for edge in response_dict["data"]["orders"]["edges"]:
+            order_id = edge["node"]["id"].rsplit("/", 1)[-1]
+            for tag in edge["node"]["tags"]:
+                if tag in tags_by_receipt:
+                    existing.setdefault(tags_by_receipt[tag], order_id)
+        return existing
+
+    def does_order_exist(self, receipt_id: int) -> str:
+        return self.existing_orders([receipt_id]).get(receipt_id, "")
+
+    def create_order(self, etsy_order: EtsyOrder, customer_id: int) -> ShopifyOrderResult:
+        return self.create_orders([(etsy_order, customer_id)])[etsy_order.receipt_id]
+
+    def create_orders(self, orders: List[Tuple[EtsyOrder, int]]) -> Dict[int, ShopifyOrderResult]:
+        """
+        Create Shopify orders for Etsy receipts, several per request as aliased orderCreate
+        mutations. The SKUs of all orders are resolved in one lookup up front, and the batch
+        size follows the points available in the cost bucket.
+        :param orders: list, (EtsyOrder, Shopify customer id) pairs.
+        :return: dict, receipt id to ShopifyOrderResult, one per order, failed or not.
+        """
+        variant_ids = {
+            sku: sku_info.variant_id
+            for sku, sku_info in self.resolve_skus(
+                t.product_sku for etsy_order, _ in orders for t in etsy_order.transactions
+            ).items()
+        }
+
+        results = {}
+        for batch in self._governed_batches(
+            orders, constants.SHOPIFY_ORDER_CREATE_BATCH_SIZE, constants.SHOPIFY_MUTATION_COST
+        ):
+            logger.info(f"Creating {len(batch)} shopify orders")
+            order_inputs = [
+                (etsy_order.receipt_id, to_order_create_input(etsy_order, customer_id, variant_ids))
+                for etsy_order, customer_id in batch
+            ]
+            results.update(self._create_order_batch(order_inputs))
+
+        for result in results.values():
+            if result.is_success:
+                logger.info(f"Shopify order {result.order_id} created for {result.receipt_id}")
+            else:
+                logger.error(
+                    f"Error occurred during order creation for {result.receipt_id}: "
+                    f"{result.errors}"
+                )
+        return results
+
+    def _create_order_batch(
+        self, order_inputs: List[Tuple[int, dict]]
+    ) -> Dict[int, ShopifyOrderResult]:
+        variable_definitions = ", ".join(
+            f"$order{i}: OrderCreateOrderInput!" for i in range(len(order_inputs))
         )
-        if new_order.errors:
-            logger.error(f"Error occurred during order creation: {new_order.errors.errors}")
-        else:
-            logger.info(f"Shopify order created successfully: {new_order}")
+        mutations = "\n".join(
+            f"""
+              order{i}: orderCreate(order: $order{i}, options: $options) {{
+                order {{
+                  id
+                }}
+                userErrors {{
+                  field
+                  message
+                }}
+              }}"""
+            for i in range(len(order_inputs))
+        )
+        variables = {f"order{i}": order_input for i, (_, order_input) in enumerate(order_inputs)}
+        variables["options"] = {
+            "inventoryBehaviour": "DECREMENT_OBEYING_POLICY",
+            "sendReceipt": True,
+        }
+        response_dict = self._execute_graphql(
+            "create_orders",
+            query=f"""
+            mutation({variable_definitions}, $options: OrderCreateOptionsInput) {{{mutations}
+            }}
+            """,
+            variables=variables,
+        )
+
+        data = response_dict.get("data") or {}
+        top_level_errors = [e.get("message", str(e)) for e in response_dict.get("errors") or []]
+        results = {}
+        for i, (receipt_id, _) in enumerate(order_inputs):
+            result = ShopifyOrderResult(receipt_id)
+            order_result = data.get(f"order{i}")
+            if order_result:
+                result.errors = [
+                    f"{e['field']}: {e['message']}" for e in order_result["userErrors"]
+                ]
+                if order_result.get("order"):
+                    result.order_id = parse_gid(order_result["order"]["id"])
+            else:
+                result.errors = top_level_errors or ["No result returned for order"]
+            results[receipt_id] = result
+        return results
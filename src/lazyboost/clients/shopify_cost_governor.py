@@ -0,0 +1,173 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+shopify_cost_governor module keeps GraphQL calls within Shopify's leaky bucket query cost limit.
+"""
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from aws_lambda_powertools import Logger
+
+from lazyboost.models.base_singleton import singleton
+from lazyboost.utilities import constants
+
+logger = Logger()
+
+
+@singleton
+class ShopifyCostGovernor:
+    """
+    Process wide view of the Shopify GraphQL cost bucket.
+    Every response reports throttleStatus, from which the governor extrapolates the points
+    available for the next query using the restore rate. Queries are delayed until their
+    expected cost fits, throttled queries are retried after the computed wait, and the actual
+    cost of every query is recorded per query name.
+    """
+
+    def __init__(self):
+        self.maximum_available = float(constants.SHOPIFY_DEFAULT_MAXIMUM_AVAILABLE)
+        self.currently_available = self.maximum_available
+        self.restore_rate = float(constants.SHOPIFY_DEFAULT_RESTORE_RATE)
+        self.throttled_count = 0
+        self.total_wait_seconds = 0.0
+
+        self._status_at = time.monotonic()
+        self._requested_costs: Dict[str, float] = {}
+        self._actual_costs: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def available(self) -> float:
+        """
+        Points expected to be available right now.
+        """
+        with self._lock:
+            return self._available(time.monotonic())
+
+    def _available(self, now: float) -> float:
+        restored = (now - self._status_at) * self.restore_rate
+        return min(self.maximum_available, self.currently_available + restored)
+
+    def affordable_size(self, max_size: int, cost_per_item: float, base_cost: float = 2) -> int:
+        """
+        Shrink a batch so that its query fits into the points available right now.
+        :param max_size: int, preferred batch size.
+        :param cost_per_item: float, estimated query cost of each item in the batch.
+        :param base_cost: float, estimated query cost independent of the batch size.
+        :return: int, batch size between 1 and max_size.
+        """
+        affordable = math.floor((self.available() - base_cost) / cost_per_item)
+        return max(1, min(max_size, affordable))
+
+    def _wait_for_budget(self, query_name: str):
+        with self._lock:
+            expected_cost = self._requested_costs.get(
+                query_name, constants.SHOPIFY_DEFAULT_QUERY_COST
+            )
+            expected_cost = min(expected_cost, self.maximum_available)
+            missing = expected_cost - self._available(time.monotonic())
+            wait = missing / self.restore_rate if missing > 0 else 0.0
+            self.total_wait_seconds += wait
+
+        if wait > 0:
+            logger.info(f"Delaying {query_name} for {wait:.2f}s to avoid Shopify throttling")
+            time.sleep(wait)
+
+    def _record(self, query_name: str, response_dict: dict) -> bool:
+        cost = (response_dict.get("extensions") or {}).get("cost")
+        if not cost:
+            return False
+
+        throttle_status = cost.get("throttleStatus") or {}
+        with self._lock:
+            if cost.get("requestedQueryCost") is not None:
+                self._requested_costs[query_name] = float(cost["requestedQueryCost"])
+            if cost.get("actualQueryCost") is not None:
+                self._actual_costs.setdefault(query_name, []).append(float(cost["actualQueryCost"]))
+            if throttle_status:
+                self.maximum_available = float(throttle_status["maximumAvailable"])
+                self.currently_available = float(throttle_status["currentlyAvailable"])
+                self.restore_rate = float(throttle_status["restoreRate"])
+                self._status_at = time.monotonic()
+        return bool(throttle_status)
+
+    @staticmethod
+    def is_throttled(response_dict: dict) -> bool:
+        return any(
+            (error.get("extensions") or {}).get("code") == "THROTTLED"
+            for error in response_dict.get("errors") or []
+            if isinstance(error, dict)
+        )
+
+    def execute(self, query_name: str, send: Callable[[], dict]) -> dict:
+        """
+        Send a GraphQL query once the bucket can afford it, retrying throttled responses.
+        :param query_name: str, name the cost of the query is tracked under.
+        :param send: callable, sends the query and returns the parsed response.
+        :return: dict, parsed GraphQL response of the last attempt.
+        """
+        for attempt in range(constants.SHOPIFY_MAX_THROTTLE_RETRIES + 1):
+            self._wait_for_budget(query_name)
+            response_dict = send()
+            has_throttle_status = self._record(query_name, response_dict)
+
+            if not self.is_throttled(response_dict):
+                return response_dict
+
+            with self._lock:
+                self.throttled_count += 1
+                if not has_throttle_status:
+                    # nothing reported, assume the bucket is empty
+                    self.currently_available = 0.0
+                    self._status_at = time.monotonic()
+            logger.warning(
+                f"Shopify throttled {query_name}, attempt {attempt + 1}",
+                available=self.available(),
+            )
+        return response_dict
+
+    def cost_summary(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Distribution of the actual query cost per query name.
+        """
+        with self._lock:
+            actual_costs = {name: sorted(costs) for name, costs in self._actual_costs.items()}
+            requested_costs = dict(self._requested_costs)
+
+        summary = {}
+        for name, costs in actual_costs.items():
+            summary[name] = {
+                "count": len(costs),
+                "min": costs[0],
+                "max": costs[-1],
+                "mean": round(sum(costs) / len(costs), 2),
+                "p95": costs[min(len(costs) - 1, math.ceil(0.95 * len(costs)) - 1)],
+                "requested": requested_costs.get(name),
+            }
+        return summary
+
+    def log_cost_summary(self):
+        """
+        Log the query cost distribution and the throttle counters.
+        """
+        logger.info(
+            "Shopify GraphQL cost summary",
+            query_costs=self.cost_summary(),
+            throttled_count=self.throttled_count,
+            total_wait_seconds=round(self.total_wait_seconds, 3),
+        )
@@ -0,0 +1,94 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+shopify_graphql_transport module sends Admin API GraphQL requests over the pooled HTTP session.
+"""
+import json
+from urllib.parse import urlsplit
+
+from aws_lambda_powertools import Logger
+
+from lazyboost.clients.http_session_pool import HttpSessionPool
+
+logger = Logger()
+
+
+class ShopifyGraphQLTransport:
+    """
+    Minimal GraphQL transport for the Shopify Admin API.
+    Credentials are sent with every request instead of being stored on the shared session, so
+    several transports and threads can use the same pooled connections at the same time.
+    """
+
+    def __init__(self, shop_url: str, api_version: str, access_token: str, timeout: float = 30):
+        self.shop_domain = self.normalize_shop_domain(shop_url)
+        self.api_version = api_version
+        self.endpoint = f"https://{self.shop_domain}/admin/api/{api_version}/graphql.json"
+        self.timeout = timeout
+        self.headers = {
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "X-Shopify-Access-Token": access_token,
+        }
+        self.session = HttpSessionPool().get_session(self.endpoint)
+
+    @staticmethod
+    def normalize_shop_domain(shop_url: str) -> str:
+        """
+        Reduce a shop url to its host, e.g. https://my-shop/ -> my-shop.myshopify.com
+        :param shop_url: str, shop name, domain or url.
+        """
+        split_url = urlsplit(shop_url if "://" in shop_url else f"https://{shop_url}")
+        if not split_url.hostname:
+            raise ValueError(f"Invalid Shopify shop url: {shop_url}")
+
+        shop_domain = split_url.hostname
+        if "." not in shop_domain:
+            shop_domain = f"{shop_domain}.myshopify.com"
+        return f"{shop_domain}:{split_url.port}" if split_url.port else shop_domain
+
+    def execute(self, query: str, variables: dict = None) -> dict:
+        """
+        POST a GraphQL query and return the parsed response.
+        GraphQL errors, including throttling, come back in the response and are left to the
+        caller. Responses without a JSON body raise a ConnectionError.
+        :param query: str, GraphQL query or mutation.
+        :param variables: dict, variables of the query.
+        :return: dict, parsed GraphQL response.
+        """
+        payload = {"query": query}
+        if variables:
+            payload["variables"] = variables
+
+        response = self.session.post(
+            self.endpoint, json=payload, headers=self.headers, timeout=self.timeout
+        )
+        try:
+            response_dict = response.json()
+        except json.JSONDecodeError:
+            response_dict = None
+
+        if not isinstance(response_dict, dict) or (
+            not response.ok and "errors" not in response_dict
+        ):
+            logger.error(
+                f"Shopify GraphQL request failed with {response.status_code}: {response.text}"
+            )
+            raise ConnectionError(
+                f"Shopify GraphQL request failed with status code: {response.status_code}"
+            )
+        return response_dict
@@ -15,10 +15,10 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
-import requests
 from aws_lambda_powertools import Logger
 from requests.auth import HTTPBasicAuth
 
+from lazyboost.clients.http_session_pool import HttpSessionPool
 from lazyboost.clients.secret_manager_client import SecretManagerClient
 from lazyboost.utilities import constants
 
@@ -36,6 +36,7 @@ class StampedIOClient:
         self.headers = {
             "Content-Type": "application/x-www-form-urlencoded",
         }
+        self.session = HttpSessionPool().get_session(constants.STAMPED_IO_BASE_URL, self.headers)
 
         logger.info("Initiating StampedIO client")
 
@@ -49,9 +50,8 @@ class StampedIOClient:
         # TODO: change back to debug
         logger.info(f"Sending request to {request_url}, data: {review_data}")
 
-        response = requests.request(
+        response = self.session.request(
             method="POST",
-            headers=self.headers,
             auth=self.basic_auth,
             url=request_url,
             data=review_data,
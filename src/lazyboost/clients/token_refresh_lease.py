@@ -0,0 +1,147 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+token_refresh_lease module elects a single OAuth token refresher across processes.
+"""
+import os
+import time
+from abc import ABC, abstractmethod
+
+from aws_lambda_powertools import Logger
+from botocore.exceptions import ClientError
+
+from lazyboost.utilities import constants
+
+logger = Logger()
+
+
+class TokenRefreshLease(ABC):
+    """
+    Time limited, exclusive right to refresh the OAuth tokens.
+    """
+
+    @abstractmethod
+    def acquire(self, owner: str, ttl: int) -> bool:
+        """
+        Try to take the lease without waiting.
+        :param owner: str, unique id of the caller.
+        :param ttl: int, seconds after which an unreleased lease can be taken over.
+        :return: bool, True if the caller holds the lease.
+        """
+
+    @abstractmethod
+    def release(self, owner: str):
+        """
+        Give up the lease, if the caller still holds it.
+        :param owner: str, unique id of the caller.
+        """
+
+
+class DynamoDBTokenLease(TokenRefreshLease):
+    """
+    Lease item in the LazyBoost state table, taken with a conditional put, so of several
+    processes that see a free lease, only the first writer wins. Unlike the secret, the table
+    is meant for frequent writes and keeps no versions.
+    """
+
+    def __init__(self, table_name: str, lease_key: str = None):
+        import boto3
+
+        self.client = boto3.client("dynamodb")
+        self.table_name = table_name
+        self.lease_key = lease_key or constants.ETSY_TOKEN_LEASE_KEY
+
+    def acquire(self, owner: str, ttl: int) -> bool:
+        now = int(time.time())
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={
+                    "pk": {"S": self.lease_key},
+                    "lease_owner": {"S": owner},
+                    "expires_at": {"N": str(now + ttl)},
+                },
+                ConditionExpression=(
+                    "attribute_not_exists(pk) OR expires_at < :now OR lease_owner = :owner"
+                ),
+                ExpressionAttributeValues={":now": {"N": str(now)}, ":owner": {"S": owner}},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+        return True
+
+    def release(self, owner: str):
+        try:
+            self.client.delete_item(
+                TableName=self.table_name,
+                Key={"pk": {"S": self.lease_key}},
+                ConditionExpression="lease_owner = :owner",
+                ExpressionAttributeValues={":owner": {"S": owner}},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            logger.warning(f"Token refresh lease {self.lease_key} was taken over before release")
+
+
+class FileTokenLease(TokenRefreshLease):
+    """
+    Lease held as an exclusive lock on a local file, for processes sharing a host and in tests.
+    The operating system drops the lock when the holder exits, the ttl is not needed.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or constants.ETSY_TOKEN_LEASE_PATH
+        self._lock_file = None
+
+    def acquire(self, owner: str, ttl: int) -> bool:
+        import fcntl
+
+        lock_file = open(self.path, "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def release(self, owner: str):
+        import fcntl
+
+        if self._lock_file:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+
+def token_refresh_lease_from_env() -> TokenRefreshLease:
+    """
+    Lease backend selected by ETSY_TOKEN_LEASE_BACKEND, "dynamodb" or "file". Defaults to
+    "dynamodb" when the LAZYBOOST_STATE_TABLE is set, to "file" otherwise.
+    """
+    table_name = os.getenv("LAZYBOOST_STATE_TABLE")
+    backend = os.getenv("ETSY_TOKEN_LEASE_BACKEND", "dynamodb" if table_name else "file").lower()
+    if backend == "file":
+        return FileTokenLease(os.getenv("ETSY_TOKEN_LEASE_PATH"))
+    if backend == "dynamodb":
+        if not table_name:
+            raise ValueError("LAZYBOOST_STATE_TABLE is required for the dynamodb lease backend")
+        return DynamoDBTokenLease(table_name)
+    raise ValueError(f"Unknown token refresh lease backend: {backend}")
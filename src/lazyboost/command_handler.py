@@ -20,9 +20,6 @@ Command Handler module handles operations after the cli receives a command
 
 from aws_lambda_powertools import Logger
 
-from lazyboost import clipboard
-from lazyboost.handlers import ListingHandler, OrderHandler, OrdersEnum, ReviewHandler
-
 logger = Logger()
 
 
@@ -32,13 +29,22 @@ def parse_received_command(received_args):
     :params received_args: Namespace object received from ArgumentParser use.
     """
     logger.info(f"Command received: {received_args}")
+    # only the modules of the received command are imported
     if received_args.opt == "clipboard":
+        from lazyboost import clipboard
+
         clipboard.update_clipboard_tags()
     elif received_args.opt == "orders":
-        OrderHandler(order_sync_type=OrdersEnum(received_args.order_option))
+        from lazyboost.handlers.order_handler import OrderHandler, OrdersEnum
+
+        OrderHandler(order_sync_type=OrdersEnum(received_args.order_option)).run()
     elif received_args.opt == "listings":
-        ListingHandler()
+        from lazyboost.handlers.listing_handler import ListingHandler
+
+        ListingHandler(full_sync=received_args.full_sync).run()
     elif received_args.opt == "review-sync":
-        ReviewHandler()
+        from lazyboost.handlers.review_handler import ReviewHandler
+
+        ReviewHandler(bulk_publish=received_args.bulk_publish).run()
     else:
         logger.error("You seem to be lost.")
@@ -14,9 +14,28 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
+"""
+handlers package exports the task handlers, each handler module is only imported on first access.
+"""
+import importlib
 
-from lazyboost.handlers.listing_handler import ListingHandler
-from lazyboost.handlers.order_handler import OrderHandler, OrdersEnum
-from lazyboost.handlers.review_handler import ReviewHandler
+_EXPORTS = {
+    "ListingHandler": "lazyboost.handlers.listing_handler",
+    "OrdersEnum": "lazyboost.handlers.order_handler",
+    "OrderHandler": "lazyboost.handlers.order_handler",
+    "ReviewHandler": "lazyboost.handlers.review_handler",
+}
 
-__all__ = [ListingHandler, OrdersEnum, OrderHandler, ReviewHandler]
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -14,48 +14,255 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import os
+from collections import Counter
 from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional, Tuple
 
 from aws_lambda_powertools import Logger
 
 from lazyboost.clients import EtsyClient, SecretManagerClient, ShopifyClient
+from lazyboost.models.shopify_product_model import ShopifyListing, ShopifyVariant
+from lazyboost.utilities import constants
+from lazyboost.utilities.pipeline import Pipeline
+from lazyboost.utilities.sync_ledger import (
+    LedgerEntry,
+    SQLiteSyncLedger,
+    content_hash,
+    listing_snapshot_path,
+)
 
 logger = Logger()
 
 
 class ListingHandler:
-    def __init__(self) -> None:
+    def __init__(self, full_sync: bool = False) -> None:
         super().__init__()
-        logger.info(f"Initializing ListingHandler")
+        logger.info(f"Initializing ListingHandler, full sync: {full_sync}")
 
         self.secret_manager_client: SecretManagerClient = SecretManagerClient()
         self.etsy_client: EtsyClient = EtsyClient()
         self.shopify_client: ShopifyClient = ShopifyClient()
 
+        # variant snapshots have no remote fallback, they are kept outside of the temporary ledger
+        self.snapshots = SQLiteSyncLedger(listing_snapshot_path())
+        self.actions = Counter()
+        # Etsy SKU -> listing id, indexed on the first variant without a snapshot
+        self._etsy_listings_by_sku: Optional[Dict[str, int]] = None
+
+        self.full_sync = full_sync
         self.sync_interval_listings = int(os.getenv("SYNC_INTERVAL_LISTINGS_MIN", 17))
-        self.timestamp_to_check = datetime.now() - timedelta(minutes=self.sync_interval_listings)
-        self.updated_listings = self.shopify_client.get_new_products(self.timestamp_to_check)
+        if full_sync:
+            # the whole catalog is exported in bulk, every variant is diffed against its snapshot
+            self.timestamp_to_check = datetime.fromtimestamp(0)
+        else:
+            self.timestamp_to_check = datetime.now() - timedelta(
+                minutes=self.sync_interval_listings
+            )
+
+    def run(self):
+        """
+        Stream the updated Shopify products into Etsy, listings are published while the next
+        products are still being fetched.
+        """
+        stats = (
+            Pipeline("listing_sync")
+            .source(self._iter_listings)
+            .map("publish", self._sync_new_listing_to_etsy)
+            .run()
+        )
+        logger.info(f"{stats['source']['items_out']} updated listings detected")
+        logger.info(
+            f"Etsy listings created: {self.actions['created']}, "
+            f"updated: {self.actions['updated']}, unchanged: {self.actions['skipped']}"
+        )
+
+    def _iter_listings(self) -> Iterator[ShopifyListing]:
+        if self.full_sync:
+            return self.shopify_client.iter_all_products_bulk()
+        return self.shopify_client.iter_new_products(self.timestamp_to_check)
+
+    def _sync_new_listing_to_etsy(self, listing: ShopifyListing):
+        """
+        Create, update or skip the Etsy listing of every updated variant, based on the listing
+        snapshots of the previous runs.
+        """
+        variant_ids = {
+            v.id
+            for v in listing.variants
+            if v.updated_at.timestamp() >= self.timestamp_to_check.timestamp()
+        }
+        snapshots = {
+            kind: self.snapshots.get_many(kind, variant_ids)
+            for kind in (
+                constants.SYNC_LEDGER_SHOPIFY_VARIANT_LISTING,
+                constants.SYNC_LEDGER_SHOPIFY_VARIANT_INVENTORY,
+                constants.SYNC_LEDGER_SHOPIFY_VARIANT_STATE,
+            )
+        }
+        for variant in listing.variants:
+            if variant.id not in variant_ids:
+                logger.info(f"Listing {listing.id} variant {variant.id} is too old to sync.")
+                continue
+            etsy_listing_dict = listing.to_etsy_listing(variant)
+            variant_snapshots = {
+                kind: entries.get(variant.id) for kind, entries in snapshots.items()
+            }
+            listing_snapshot = variant_snapshots[constants.SYNC_LEDGER_SHOPIFY_VARIANT_LISTING]
+            if listing_snapshot and listing_snapshot.remote_id is not None:
+                etsy_listing_id = int(listing_snapshot.remote_id)
+            else:
+                # the snapshot store may be new or lost, never duplicate a listing Etsy has
+                etsy_listing_id = self._find_etsy_listing_id(variant.sku)
+            if etsy_listing_id is None:
+                self._create_listing(listing, variant, etsy_listing_dict)
+            else:
+                self._update_listing(variant, etsy_listing_id, etsy_listing_dict, variant_snapshots)
+
+    def _find_etsy_listing_id(self, sku: str) -> Optional[int]:
+        """
+        Etsy listing of a SKU, from an index of all shop listings built on the first lookup.
+        """
+        if self._etsy_listings_by_sku is None:
+            self._etsy_listings_by_sku = {}
+            for state in constants.ETSY_LISTING_STATES:
+                for etsy_listing in self.etsy_client.iter_shop_listings(state):
+                    for listing_sku in etsy_listing.get("skus") or []:
+                        self._etsy_listings_by_sku[listing_sku] = int(etsy_listing["listing_id"])
+            logger.info(f"Indexed {len(self._etsy_listings_by_sku)} Etsy listing SKUs")
+        etsy_listing_id = self._etsy_listings_by_sku.get(sku)
+        if etsy_listing_id is not None:
+            logger.info(f"Found Etsy listing {etsy_listing_id} without a snapshot for SKU {sku}")
+        return etsy_listing_id
 
-        logger.info(f"{len(self.updated_listings)} updated listings detected")
-        if len(self.updated_listings) == 0:
+    def _create_listing(
+        self, listing: ShopifyListing, variant: ShopifyVariant, etsy_listing_dict: dict
+    ):
+        if variant.inventory_quantity <= 0:
+            logger.info(f"Listing {listing.id} variant {variant.id} is out of stock, skipping.")
+            self.actions["skipped"] += 1
             return
+        logger.info(f"Creating new listing: {etsy_listing_dict}")
+        response = self.etsy_client.create_listing(etsy_listing_dict)
+        logger.info(f"Successfully created new listing: {response['listing_id']}")
+        logger.info(f"Etsy listing response: {response}")
+        if self._etsy_listings_by_sku is not None:
+            self._etsy_listings_by_sku[variant.sku] = int(response["listing_id"])
+        listing_fields, inventory_fields = self._split_etsy_listing(etsy_listing_dict)
+        self.snapshots.record(
+            constants.SYNC_LEDGER_SHOPIFY_VARIANT_LISTING,
+            variant.id,
+            response["listing_id"],
+            listing_fields,
+        )
+        self.snapshots.record(
+            constants.SYNC_LEDGER_SHOPIFY_VARIANT_INVENTORY,
+            variant.id,
+            response["listing_id"],
+            inventory_fields,
+        )
+        self.actions["created"] += 1
 
-        self._sync_new_listings_to_etsy()
-
-    def _sync_new_listings_to_etsy(self):
-        for listing in self.updated_listings:
-            for variant in listing.variants:
-                if (
-                    variant.updated_at.timestamp() >= self.timestamp_to_check.timestamp()
-                    and variant.inventory_quantity > 0
-                ):
-                    etsy_listing_dict = listing.to_etsy_listing(variant)
-                    logger.info(f"Creating new listing: {etsy_listing_dict}")
-                    response = self.etsy_client.create_listing(etsy_listing_dict)
-                    logger.info(f"Successfully created new listing: {response['listing_id']}")
-                    logger.info(f"Etsy listing response: {response}")
-                else:
-                    logger.info(f"Listing {listing.id} variant {variant.id} is too old to sync.")
+    def _update_listing(
+        self,
+        variant: ShopifyVariant,
+        etsy_listing_id: int,
+        etsy_listing_dict: dict,
+        snapshots: Dict[str, Optional[LedgerEntry]],
+    ):
+        """
+        Write the parts of the listing that changed since their snapshot. A variant out of
+        stock deactivates its listing, as Etsy rejects an inventory without quantity, and the
+        listing is activated again once the variant is back in stock.
+        """
+        listing_fields, inventory_fields = self._split_etsy_listing(etsy_listing_dict)
+        listing_snapshot = snapshots[constants.SYNC_LEDGER_SHOPIFY_VARIANT_LISTING]
+        inventory_snapshot = snapshots[constants.SYNC_LEDGER_SHOPIFY_VARIANT_INVENTORY]
+        state_snapshot = snapshots[constants.SYNC_LEDGER_SHOPIFY_VARIANT_STATE]
+        deactivated = state_snapshot is not None and state_snapshot.content_hash == content_hash(
+            constants.ETSY_LISTING_STATE_INACTIVE
+        )
+        updated = False
+
+        if listing_snapshot is None or content_hash(listing_fields) != (
+            listing_snapshot.content_hash
+        ):
+            logger.info(f"Updating listing {etsy_listing_id}: {listing_fields}")
+            self.etsy_client.update_listing(etsy_listing_id, listing_fields)
+            self.snapshots.record(
+                constants.SYNC_LEDGER_SHOPIFY_VARIANT_LISTING,
+                variant.id,
+                etsy_listing_id,
+                listing_fields,
+            )
+            updated = True
+
+        if variant.inventory_quantity <= 0:
+            if not deactivated:
+                logger.info(f"Variant {variant.id} is out of stock, deactivating {etsy_listing_id}")
+                self.etsy_client.update_listing(
+                    etsy_listing_id, {"state": constants.ETSY_LISTING_STATE_INACTIVE}
+                )
+                self.snapshots.record(
+                    constants.SYNC_LEDGER_SHOPIFY_VARIANT_STATE,
+                    variant.id,
+                    etsy_listing_id,
+                    constants.ETSY_LISTING_STATE_INACTIVE,
+                )
+                self.snapshots.record(
+                    constants.SYNC_LEDGER_SHOPIFY_VARIANT_INVENTORY,
+                    variant.id,
+                    etsy_listing_id,
+                    inventory_fields,
+                )
+                updated = True
+        elif (
+            deactivated
+            or inventory_snapshot is None
+            or content_hash(inventory_fields) != inventory_snapshot.content_hash
+        ):
+            logger.info(f"Updating inventory of listing {etsy_listing_id}: {inventory_fields}")
+            self.etsy_client.update_listing_inventory(
+                etsy_listing_id, ShopifyListing.to_etsy_listing_inventory(inventory_fields)
+            )
+            self.snapshots.record(
+                constants.SYNC_LEDGER_SHOPIFY_VARIANT_INVENTORY,
+                variant.id,
+                etsy_listing_id,
+                inventory_fields,
+            )
+            if deactivated:
+                logger.info(f"Variant {variant.id} is back in stock, activating {etsy_listing_id}")
+                self.etsy_client.update_listing(
+                    etsy_listing_id, {"state": constants.ETSY_LISTING_STATE_ACTIVE}
+                )
+                self.snapshots.record(
+                    constants.SYNC_LEDGER_SHOPIFY_VARIANT_STATE,
+                    variant.id,
+                    etsy_listing_id,
+                    constants.ETSY_LISTING_STATE_ACTIVE,
+                )
+            updated = True
+
+        if updated:
+            self.actions["updated"] += 1
+        else:
+            logger.info(f"Listing {etsy_listing_id} of variant {variant.id} is unchanged.")
+            self.actions["skipped"] += 1
+
+    @staticmethod
+    def _split_etsy_listing(etsy_listing_dict: dict) -> Tuple[dict, dict]:
+        """
+        Split an Etsy listing payload into its listing fields and its inventory fields.
+        """
+        listing_fields = {
+            k: v
+            for k, v in etsy_listing_dict.items()
+            if k not in constants.ETSY_LISTING_INVENTORY_FIELDS
+        }
+        inventory_fields = {
+            k: etsy_listing_dict[k] for k in constants.ETSY_LISTING_INVENTORY_FIELDS
+        }
+        return listing_fields, inventory_fields
 
     def _get_shipping_profile_ids(self):
         response = self.etsy_client.get_shipping_profiles()
@@ -20,15 +20,19 @@ OrderHandler module handles operations related to order sync
 """
 import sys
 from enum import auto
-from typing import List
+from typing import Iterator
 
 from aws_lambda_powertools import Logger
 
 from lazyboost.clients.etsy_client import EtsyClient
 from lazyboost.clients.secret_manager_client import SecretManagerClient
 from lazyboost.clients.shopify_client import ShopifyClient
+from lazyboost.handlers.order_pipeline import OrderSyncPipeline
 from lazyboost.models.base_enum import BaseEnum
 from lazyboost.models.etsy_order import EtsyOrder
+from lazyboost.utilities import constants
+from lazyboost.utilities.checkpoint_store import checkpoint_store_from_env
+from lazyboost.utilities.sync_ledger import sync_ledger_from_env
 
 logger = Logger()
 
@@ -43,53 +47,60 @@ class OrderHandler:
     def __init__(self, order_sync_type: OrdersEnum) -> None:
         super().__init__()
         logger.info(f"Initializing OrderHandler for: {order_sync_type}")
+        self.order_sync_type = order_sync_type
 
         self.secret_manager_client = SecretManagerClient()
         self.etsy_client = EtsyClient()
         self.shopify_client = ShopifyClient()
+        self.checkpoints = checkpoint_store_from_env(self.secret_manager_client)
+        self.ledger = sync_ledger_from_env()
 
-        if order_sync_type == OrdersEnum.SYNC:
-            etsy_orders = self._get_etsy_orders()
-            if not etsy_orders:
-                logger.info("No Etsy open orders detected.")
-            else:
-                self._sync_etsy_orders(etsy_orders)
-        elif order_sync_type == OrdersEnum.ETSY_TO_SHOPIFY:
+    def run(self):
+        if self.order_sync_type == OrdersEnum.SYNC:
+            self._sync_etsy_orders()
+        elif self.order_sync_type == OrdersEnum.ETSY_TO_SHOPIFY:
             pass
-        elif order_sync_type == OrdersEnum.SHOPIFY_TO_ETSY:
+        elif self.order_sync_type == OrdersEnum.SHOPIFY_TO_ETSY:
             pass
         else:
             logger.error("Unknown type of order detected, exiting...")
             sys.exit(1)
 
-    def _get_etsy_orders(self) -> List[EtsyOrder]:
-        response = self.etsy_client.get_shop_receipts()
-
-        etsy_orders = []
-        for r in response["results"]:
-            logger.info(f"Checking open order...", order=r)
-            e = EtsyOrder.from_dict(r)
-
+    def _iter_etsy_orders(self, window_start: int, window_end: int) -> Iterator[EtsyOrder]:
+        """
+        Open receipts modified within the window, so receipts paid after their creation are
+        picked up as well.
+        """
+        for e in self.etsy_client.iter_shop_receipts(
+            min_last_modified=window_start, max_last_modified=window_end
+        ):
             logger.info(f"Detected open etsy order: {e}")
-            etsy_orders.append(e)
-        return etsy_orders
-
-    def _sync_etsy_orders(self, etsy_orders: List[EtsyOrder]):
-        for order in etsy_orders:
-
-            order_id = self.shopify_client.does_order_exist(order.receipt_id)
-
-            if order_id:
-                logger.info(f"Order Id: {order_id} already exists, skipping")
-                continue
-
-            logger.info(f"New order detected: {order_id}")
-            sc = self.shopify_client.is_existing_customer(order.buyer)
-            if sc:
-                logger.info(f"Existing customer: {sc.id} placed an order.")
-                self.shopify_client.update_customer(order.buyer, sc)
-                customer_id = sc.id
-            else:
-                customer_id = self.shopify_client.create_customer(order.buyer)
-
-            self.shopify_client.create_order(order, customer_id)
+            yield e
+
+    def _sync_etsy_orders(self):
+        """
+        Create Shopify orders for the receipts of the window that don't have one yet.
+        When receipts failed, the checkpoint only advances to just before the earliest of them,
+        so they are retried on the next run, and a RuntimeError listing them is raised once all
+        other receipts are synced.
+        """
+        window_start, window_end = self.checkpoints.sync_window(
+            constants.CHECKPOINT_STREAM_ETSY_RECEIPTS,
+            self.etsy_client.sync_interval_orders,
+            overlap=constants.CHECKPOINT_RECEIPTS_OVERLAP_SEC,
+        )
+        pipeline = OrderSyncPipeline(self.shopify_client, self.ledger)
+        failed_orders = pipeline.run(self._iter_etsy_orders(window_start, window_end))
+        if not pipeline.received:
+            logger.info("No Etsy open orders detected.")
+
+        synced_until = window_end
+        if failed_orders:
+            synced_until = min(o.update_timestamp for o in failed_orders) - 1
+        self.checkpoints.advance(constants.CHECKPOINT_STREAM_ETSY_RECEIPTS, synced_until)
+
+        if failed_orders:
+            raise RuntimeError(
+                f"{len(failed_orders)} of {len(pipeline.received)} receipts failed to sync: "
+                f"{pipeline.failures}"
+            )
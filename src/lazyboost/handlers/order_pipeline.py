@@ -0,0 +1,163 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+order_pipeline module syncs new Etsy receipts to Shopify as a streaming pipeline.
+"""
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aws_lambda_powertools import Logger
+
+from lazyboost.clients.shopify_client import ShopifyClient
+from lazyboost.models.etsy_order import EtsyOrder
+from lazyboost.utilities import constants
+from lazyboost.utilities.pipeline import Pipeline
+from lazyboost.utilities.sync_ledger import SyncLedger, content_hash
+
+logger = Logger()
+
+
+class OrderSyncPipeline:
+    """
+    Creates Shopify orders for Etsy receipts, while further receipt pages are still fetched.
+    Receipts recorded in the sync ledger are skipped, the others go through a batched
+    existence check, the customer lookup and upsert, and batched order creation.
+    Customers are resolved concurrently, but the receipts of one buyer go through a single
+    worker in order, and later receipts re-use the customer of the first one, so a buyer never
+    ends up with duplicate customers. A failing receipt is recorded and does not stop the others.
+    """
+
+    def __init__(self, shopify_client: ShopifyClient, ledger: SyncLedger, max_workers: int = None):
+        self.shopify_client = shopify_client
+        self.ledger = ledger
+        self.max_workers = max_workers or int(
+            os.getenv("ORDER_SYNC_WORKERS", constants.ORDER_SYNC_WORKERS)
+        )
+        self.received: List[EtsyOrder] = []
+        self.failures: Dict[int, str] = {}
+        self._failures_lock = threading.Lock()
+        # buyer user id -> Shopify customer id, each buyer is only touched by one worker
+        self._buyer_customers: Dict[str, int] = {}
+
+    def run(self, etsy_orders: Iterable[EtsyOrder]) -> List[EtsyOrder]:
+        """
+        Sync receipts that have no Shopify order yet.
+        :param etsy_orders: iterable, receipts, consumed while the pipeline runs.
+        :return: list, receipts that failed, details are in failures.
+        """
+        Pipeline("order_sync").source(lambda: etsy_orders).batch(
+            "ledger", self._skip_synced, constants.ETSY_PAGE_LIMIT
+        ).batch("exists", self._skip_existing, constants.SHOPIFY_ORDER_TAG_BATCH_SIZE).map(
+            "customer",
+            self._resolve_customer,
+            workers=self.max_workers,
+            key=lambda order: order.buyer.user_id,
+        ).batch(
+            "create", self._create_orders, constants.SHOPIFY_ORDER_CREATE_BATCH_SIZE
+        ).run()
+
+        logger.info(f"Order sync finished, {len(self.failures)} of {len(self.received)} failed")
+        return [o for o in self.received if o.receipt_id in self.failures]
+
+    def _fail(self, etsy_order: EtsyOrder, stage: str, error: str):
+        logger.error(f"Receipt {etsy_order.receipt_id} failed in stage {stage}: {error}")
+        with self._failures_lock:
+            self.failures[etsy_order.receipt_id] = f"{stage}: {error}"
+
+    def _skip_synced(self, etsy_orders: List[EtsyOrder]) -> List[EtsyOrder]:
+        self.received.extend(etsy_orders)
+        try:
+            synced = self.ledger.get_many(
+                constants.SYNC_LEDGER_ETSY_RECEIPT, (o.receipt_id for o in etsy_orders)
+            )
+        except Exception as e:
+            for order in etsy_orders:
+                self._fail(order, "ledger", str(e))
+            return []
+        for order in etsy_orders:
+            entry = synced.get(str(order.receipt_id))
+            if not entry:
+                continue
+            logger.info(
+                f"Order Id: {entry.remote_id} for receipt {order.receipt_id} synced, skipping"
+            )
+            if entry.content_hash != content_hash(order):
+                logger.debug(f"Receipt {order.receipt_id} changed since it was synced")
+        return [o for o in etsy_orders if str(o.receipt_id) not in synced]
+
+    def _skip_existing(self, etsy_orders: List[EtsyOrder]) -> List[EtsyOrder]:
+        # only receipts missing from the ledger are checked against Shopify
+        try:
+            existing_orders = self.shopify_client.existing_orders(o.receipt_id for o in etsy_orders)
+        except Exception as e:
+            for order in etsy_orders:
+                self._fail(order, "exists", str(e))
+            return []
+
+        new_orders = []
+        for order in etsy_orders:
+            if order.receipt_id not in existing_orders:
+                new_orders.append(order)
+                continue
+            logger.info(
+                f"Order Id: {existing_orders[order.receipt_id]} for receipt "
+                f"{order.receipt_id} already exists, skipping"
+            )
+            try:
+                self.ledger.record(
+                    constants.SYNC_LEDGER_ETSY_RECEIPT,
+                    order.receipt_id,
+                    existing_orders[order.receipt_id],
+                    order,
+                )
+            except Exception as e:
+                self._fail(order, "exists", str(e))
+        return new_orders
+
+    def _resolve_customer(self, etsy_order: EtsyOrder) -> Optional[Tuple[EtsyOrder, int]]:
+        logger.info(f"New order detected: {etsy_order.receipt_id}")
+        customer_id = self._buyer_customers.get(etsy_order.buyer.user_id)
+        if customer_id is None:
+            try:
+                sc = self.shopify_client.is_existing_customer(etsy_order.buyer)
+                if sc:
+                    logger.info(f"Existing customer: {sc.id} placed an order.")
+                customer_id = self.shopify_client.upsert_customer(etsy_order.buyer, sc)
+            except Exception as e:
+                self._fail(etsy_order, "customer", str(e))
+                return None
+            self._buyer_customers[etsy_order.buyer.user_id] = customer_id
+        return etsy_order, customer_id
+
+    def _create_orders(self, orders_with_customers: List[Tuple[EtsyOrder, int]]) -> List:
+        try:
+            results = self.shopify_client.create_orders(orders_with_customers)
+        except Exception as e:
+            for order, _ in orders_with_customers:
+                self._fail(order, "create", str(e))
+            return []
+
+        for order, _ in orders_with_customers:
+            result = results[order.receipt_id]
+            if result.is_success:
+                self.ledger.record(
+                    constants.SYNC_LEDGER_ETSY_RECEIPT, order.receipt_id, result.order_id, order
+                )
+            else:
+                self._fail(order, "create", str(result.errors))
+        return []
@@ -0,0 +1,127 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+"""
+ReviewEnricher module attaches transactions and receipts to Etsy reviews in bulk.
+"""
+import os
+from datetime import timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from aws_lambda_powertools import Logger
+
+from lazyboost.clients.etsy_client import EtsyClient
+from lazyboost.models.etsy_order import EtsyOrder
+from lazyboost.models.etsy_review_model import EtsyReview
+from lazyboost.models.etsy_transaction_model import EtsyTransaction
+from lazyboost.utilities import constants
+
+logger = Logger()
+
+
+class ReviewEnricher:
+    """
+    Enriches a batch of reviews from a single sweep over the shop receipts, with transactions
+    embedded, instead of two requests per review. The sweep walks receipts newest first, from
+    the newest review back to ETSY_REVIEW_RECEIPT_LOOKBACK_DAYS before the oldest one, and stops
+    once every transaction is found or once it would cost more requests than it saves.
+    Swept transactions are kept, so later batches only sweep the part of their window that
+    was not covered yet.
+    """
+
+    def __init__(self, etsy_client: EtsyClient) -> None:
+        self.etsy_client = etsy_client
+        self.lookback_days = int(os.getenv("ETSY_REVIEW_RECEIPT_LOOKBACK_DAYS", 60))
+        self._transactions: Dict[int, Tuple[EtsyTransaction, EtsyOrder]] = {}
+        self._swept: Optional[Tuple[int, int]] = None
+
+    def build_index(
+        self, transaction_ids: Set[int], min_created: int, max_created: int
+    ) -> Dict[int, Tuple[EtsyTransaction, EtsyOrder]]:
+        """
+        Sweep the receipts of the window not swept before and index the requested transactions.
+        :param transaction_ids: set, transaction ids to look for.
+        :param min_created: int, epoch seconds lower bound of the receipt creation.
+        :param max_created: int, epoch seconds upper bound of the receipt creation.
+        :return: dict, transaction_id -> (EtsyTransaction, EtsyOrder), only for found ids.
+        """
+        missing = set(transaction_ids) - self._transactions.keys()
+        for window_start, window_end in self._unswept(min_created, max_created):
+            if not missing:
+                break
+            self._sweep(missing, window_start, window_end)
+
+        index = {t: self._transactions[t] for t in transaction_ids if t in self._transactions}
+        logger.info(f"Indexed {len(index)} of {len(transaction_ids)} review transactions")
+        return index
+
+    def _unswept(self, min_created: int, max_created: int) -> List[Tuple[int, int]]:
+        if self._swept is None:
+            return [(min_created, max_created)]
+        swept_start, swept_end = self._swept
+        windows = []
+        if max_created > swept_end:
+            windows.append((max(min_created, swept_end), max_created))
+        if min_created < swept_start:
+            windows.append((min_created, min(max_created, swept_start)))
+        return windows
+
+    def _sweep(self, missing: Set[int], min_created: int, max_created: int):
+        receipts_seen = set()
+        covered_start = min_created
+        # the per review path costs two requests for every transaction still missing
+        for etsy_transaction, etsy_order in self.etsy_client.iter_receipt_transactions(
+            min_created, max_created
+        ):
+            receipts_seen.add(etsy_order.receipt_id)
+            self._transactions[etsy_transaction.transaction_id] = (etsy_transaction, etsy_order)
+            missing.discard(etsy_transaction.transaction_id)
+
+            sweep_requests = len(receipts_seen) // constants.ETSY_PAGE_LIMIT + 1
+            if not missing or sweep_requests >= 2 * len(missing):
+                # receipts come newest first, older ones of the window were not swept
+                covered_start = etsy_order.create_timestamp
+                break
+
+        logger.info(f"Swept {len(receipts_seen)} receipts for review transactions")
+        if self._swept and covered_start <= self._swept[1] and max_created >= self._swept[0]:
+            self._swept = (min(covered_start, self._swept[0]), max(max_created, self._swept[1]))
+        else:
+            self._swept = (covered_start, max_created)
+
+    def enrich(self, etsy_reviews: List[EtsyReview]) -> List[EtsyReview]:
+        """
+        Attach transaction and receipt to every review found in the receipts sweep.
+        :param etsy_reviews: list, reviews to enrich.
+        :return: list, reviews that were not covered by the sweep and still need enrichment.
+        """
+        if not etsy_reviews:
+            return []
+
+        created = [r.create_timestamp for r in etsy_reviews]
+        min_created = min(created) - int(timedelta(days=self.lookback_days).total_seconds())
+        index = self.build_index(
+            {r.transaction_id for r in etsy_reviews}, min_created, max(created)
+        )
+
+        not_enriched = []
+        for review in etsy_reviews:
+            if review.transaction_id in index:
+                review.set_additional_info(*index[review.transaction_id])
+            else:
+                not_enriched.append(review)
+        return not_enriched
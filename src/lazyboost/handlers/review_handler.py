@@ -19,8 +19,9 @@
 ReviewHandler module handles operations related to pulling reviews from Etsy.
 """
 import csv
-from datetime import datetime, timedelta
-from typing import List
+import os
+from datetime import datetime
+from typing import Iterator, List, Tuple
 
 from aws_lambda_powertools import Logger
 
@@ -28,69 +29,206 @@ from lazyboost.clients import ShopifyClient
 from lazyboost.clients.etsy_client import EtsyClient
 from lazyboost.clients.judge_me_client import JudgeMeClient
 from lazyboost.clients.secret_manager_client import SecretManagerClient
+from lazyboost.handlers.review_enricher import ReviewEnricher
 from lazyboost.models.etsy_review_model import EtsyReview
+from lazyboost.models.judge_me_model import JudgeMeReviewResult
+from lazyboost.utilities import constants
+from lazyboost.utilities.checkpoint_store import checkpoint_store_from_env
+from lazyboost.utilities.pipeline import Pipeline
+from lazyboost.utilities.sync_ledger import sync_ledger_from_env
 
 logger = Logger()
 
 
 class ReviewHandler:
-    def __init__(self) -> None:
+    def __init__(self, bulk_publish: bool = False) -> None:
         super().__init__()
-        logger.info(f"Initializing ReviewHandler")
+        logger.info(f"Initializing ReviewHandler, bulk publish: {bulk_publish}")
+        self.bulk_publish = bulk_publish
 
         self.secret_manager_client = SecretManagerClient()
         self.etsy_client = EtsyClient()
         self.shopify_client = ShopifyClient()
         self.judge_me_client = JudgeMeClient()
-
-        etsy_reviews = self._get_etsy_reviews()
-        if not etsy_reviews:
-            logger.info("No new Etsy reviews detected.")
+        self.checkpoints = checkpoint_store_from_env(self.secret_manager_client)
+        self.ledger = sync_ledger_from_env()
+        self.enricher = ReviewEnricher(self.etsy_client)
+        self.failed_reviews: List[EtsyReview] = []
+
+    def run(self):
+        """
+        Stream the reviews of the window through ledger check, enrichment, transformation and
+        publishing to Judge.me, then advance the reviews checkpoint.
+        When reviews failed to publish, they are exported for a CSV import, the checkpoint only
+        advances to just before the earliest of them, so they are retried on the next run, and a
+        RuntimeError listing them is raised.
+        """
+        self.failed_reviews = []
+        window_start, window_end = self.checkpoints.sync_window(
+            constants.CHECKPOINT_STREAM_ETSY_REVIEWS, self.etsy_client.sync_interval_reviews
+        )
+        pipeline = (
+            Pipeline("review_sync")
+            .source(lambda: self._iter_etsy_reviews(window_start, window_end))
+            .batch("ledger", self._skip_synced, constants.ETSY_PAGE_LIMIT)
+            .batch("enrich", self._enrich_reviews, constants.ETSY_PAGE_LIMIT)
+            .batch(
+                "transform", lambda b: list(self._judge_me_reviews(b)), constants.ETSY_PAGE_LIMIT
+            )
+        )
+        if self.bulk_publish:
+            pipeline.batch(
+                "publish",
+                self._publish_reviews,
+                int(os.getenv("JUDGE_ME_BATCH_SIZE", constants.JUDGE_ME_BATCH_SIZE)),
+            )
         else:
-            self._sync_etsy_reviews(etsy_reviews)
+            pipeline.map("publish", self._publish_review)
+        stats = pipeline.run()
 
-    def _get_etsy_reviews(self):
-        response = self.etsy_client.get_shop_reviews()
+        if not stats["source"]["items_out"]:
+            logger.info("No new Etsy reviews detected.")
+        synced_until = window_end
+        if self.failed_reviews:
+            logger.warning(f"Exporting {len(self.failed_reviews)} failed reviews for a CSV import")
+            self.export_etsy_reviews(self.failed_reviews)
+            synced_until = min(r.create_timestamp for r in self.failed_reviews) - 1
+        self.checkpoints.advance(constants.CHECKPOINT_STREAM_ETSY_REVIEWS, synced_until)
+
+        if self.failed_reviews:
+            raise RuntimeError(
+                f"{len(self.failed_reviews)} reviews failed to publish: "
+                f"{[r.transaction_id for r in self.failed_reviews]}"
+            )
 
-        etsy_reviews = []
-        for r in response["results"]:
-            e = EtsyReview.from_dict(r)
+    def _iter_etsy_reviews(self, window_start: int, window_end: int) -> Iterator[EtsyReview]:
+        for e in self.etsy_client.iter_shop_reviews(window_start, window_end):
             logger.info(f"Detected Etsy review: {e}")
-            e.get_additional_info(self.etsy_client)
-            logger.debug(f"Retrieved full etsy review information: {e}")
-            etsy_reviews.append(e)
+            yield e
+
+    def _skip_synced(self, etsy_reviews: List[EtsyReview]) -> List[EtsyReview]:
+        """
+        Drop reviews published before, ahead of spending any request on them.
+        """
+        synced = self.ledger.get_many(
+            constants.SYNC_LEDGER_ETSY_REVIEW, (e.transaction_id for e in etsy_reviews)
+        )
+        if synced:
+            logger.info(f"Skipping {len(synced)} reviews already published to JudgeMe")
+        return [e for e in etsy_reviews if str(e.transaction_id) not in synced]
+
+    def _enrich_reviews(self, etsy_reviews: List[EtsyReview]) -> List[EtsyReview]:
+        not_enriched = self.enricher.enrich(etsy_reviews)
+        if not_enriched:
+            # asyncio is only loaded for the fallback, the receipts sweep usually finds all
+            import asyncio
+
+            logger.info(f"Enriching {len(not_enriched)} reviews not found in the receipts sweep")
+            asyncio.run(self._enrich_etsy_reviews(not_enriched))
         return etsy_reviews
 
-    def _sync_etsy_reviews(self, etsy_reviews: List[EtsyReview]):
+    async def _enrich_etsy_reviews(self, etsy_reviews: List[EtsyReview]):
+        """
+        Fetch transaction and receipt of every review, fanning out over reviews concurrently.
+        """
+        from lazyboost.clients.async_etsy_client import AsyncEtsyClient
+        from lazyboost.utilities.utility_async import gather_bounded
+
+        async with AsyncEtsyClient(self.etsy_client) as async_etsy_client:
+            await gather_bounded(
+                (e.get_additional_info_async(async_etsy_client) for e in etsy_reviews),
+                limit=async_etsy_client.max_concurrency,
+            )
+        for e in etsy_reviews:
+            logger.debug(f"Retrieved full etsy review information: {e}")
+
+    def _resolve_review_products(self, etsy_reviews: List[EtsyReview]) -> dict:
+        """
+        Resolve the products of all reviewed SKUs in one batched lookup.
+        """
+        sku_info = self.shopify_client.resolve_skus(
+            review.etsy_transaction.sku for review in etsy_reviews
+        )
+        return {sku: info.product for sku, info in sku_info.items()}
+
+    def _judge_me_reviews(
+        self, etsy_reviews: List[EtsyReview]
+    ) -> Iterator[Tuple[EtsyReview, dict]]:
+        """
+        Transform reviews into Judge.me review data, skipping reviews without a Shopify product.
+        """
+        shopify_products = self._resolve_review_products(etsy_reviews)
         for review in etsy_reviews:
             if review.etsy_transaction.sku:
-                shopify_product = self.shopify_client.get_product_info(review.etsy_transaction.sku)
+                shopify_product = shopify_products.get(review.etsy_transaction.sku)
             else:
                 logger.error(f"Etsy review did not contain sku: {review}")
                 continue
 
-            review_transformed = review.to_judge_me_review_dict(
+            if not shopify_product:
+                logger.error(f"No Shopify product found for Etsy review: {review}")
+                continue
+
+            yield review, review.to_judge_me_review_dict(
                 self.shopify_client.shopify_domain, int(shopify_product.id.rsplit("/", 1)[-1])
             )
 
-            logger.info("Creating a new review on JudgeMe...")
-            self.judge_me_client.create_review(review_transformed)
+    def _publish_review(self, transformed_review: Tuple[EtsyReview, dict]):
+        review, review_transformed = transformed_review
+        logger.info("Creating a new review on JudgeMe...")
+        result = JudgeMeReviewResult(
+            review.transaction_id, self.judge_me_client.create_review(review_transformed)
+        )
+        self.ledger.record(
+            constants.SYNC_LEDGER_ETSY_REVIEW,
+            review.transaction_id,
+            result.review_id,
+            review_transformed,
+        )
+
+    def _publish_reviews(self, transformed_reviews: List[Tuple[EtsyReview, dict]]) -> List:
+        """
+        Publish a batch of reviews to Judge.me concurrently.
+        Reviews that failed to publish are exported to a Judge.me import CSV at the end.
+        """
+        reviews = {review.transaction_id: (review, data) for review, data in transformed_reviews}
+        results = self.judge_me_client.create_reviews(
+            [(key, data) for key, (_, data) in reviews.items()]
+        )
+        for key, result in results.items():
+            review, review_transformed = reviews[key]
+            if result.is_success:
+                self.ledger.record(
+                    constants.SYNC_LEDGER_ETSY_REVIEW, key, result.review_id, review_transformed
+                )
+            else:
+                self.failed_reviews.append(review)
+
+        logger.info(
+            f"Published {sum(r.is_success for r in results.values())} of {len(results)} "
+            f"reviews to JudgeMe"
+        )
+        return []
 
     def export_etsy_reviews(self, etsy_reviews: List[EtsyReview]):
+        shopify_products = self._resolve_review_products(etsy_reviews)
         csv_rows = []
         for review in etsy_reviews:
             shopify_product = None
             if review.etsy_transaction.sku:
-                shopify_product = self.shopify_client.get_product_info(review.etsy_transaction.sku)
+                shopify_product = shopify_products.get(review.etsy_transaction.sku)
             else:
                 logger.warning(f"Parsing review without an SKU: {review}")
 
             csv_rows.append(review.csv_row_judge_me(shopify_product))
 
         date_now = datetime.now().strftime("%m%d%Y")
-        with open(
-            f"{self.shopify_client.shopify_domain}-etsy-reviews-{date_now}.csv", "w"
-        ) as csv_file:
+        csv_path = os.path.join(
+            os.getenv("REVIEW_EXPORT_DIR", constants.REVIEW_EXPORT_DIR),
+            f"{self.shopify_client.shopify_domain}-etsy-reviews-{date_now}.csv",
+        )
+        with open(csv_path, "w") as csv_file:
             csv_writer = csv.writer(csv_file, delimiter=",")
             csv_writer.writerow(EtsyReview.csv_header_judge_me())
             csv_writer.writerows(csv_rows)
+        logger.info(f"Exported {len(csv_rows)} reviews to {csv_path}")
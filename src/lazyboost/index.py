@@ -14,16 +14,67 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
+import importlib
 import os
+from types import ModuleType
+from typing import Callable, Dict, Tuple
 
-import boto3
 from aws_lambda_powertools import Logger
 
-from lazyboost.handlers import OrderHandler, OrdersEnum, ReviewHandler
-
 logger = Logger()
 
 
+def _run_order_sync(handler_module: ModuleType, event: dict):
+    handler_module.OrderHandler(order_sync_type=handler_module.OrdersEnum.SYNC).run()
+
+
+def _run_review_sync(handler_module: ModuleType, event: dict):
+    handler_module.ReviewHandler(bulk_publish=bool(event.get("bulk_publish", False))).run()
+
+
+# task -> (handler module, runner), handler modules and their clients load on dispatch only
+TASKS: Dict[str, Tuple[str, Callable[[ModuleType, dict], None]]] = {
+    "order_sync": ("lazyboost.handlers.order_handler", _run_order_sync),
+    "review_sync": ("lazyboost.handlers.review_handler", _run_review_sync),
+    "sync": ("lazyboost.handlers.order_handler", _run_order_sync),
+}
+
+
+def load_task_handler(task: str) -> ModuleType:
+    """
+    Import the handler module of a task.
+    :param task: str, task name of the lambda event.
+    """
+    return importlib.import_module(TASKS[task][0])
+
+
+def _log_client_stats():
+    from lazyboost.clients.etsy_rate_limiter import EtsyRateLimiter
+    from lazyboost.clients.http_session_pool import HttpSessionPool
+    from lazyboost.clients.shopify_cost_governor import ShopifyCostGovernor
+
+    HttpSessionPool().log_connection_stats()
+    EtsyRateLimiter().log_quota_state()
+    ShopifyCostGovernor().log_cost_summary()
+
+
+def _notify_error(error: Exception):
+    sns_topic_arn = os.getenv("SNS_ERROR_TOPIC")
+    if not sns_topic_arn:
+        return
+
+    # boto3 for SNS is only needed once something failed
+    import boto3
+
+    sns_client = boto3.client("sns")
+    response = sns_client.publish(
+        TopicArn=sns_topic_arn,
+        Message=f"An error occurred during execution of LazyBoost.\n\n" f"Error: `{error}`\n",
+        Subject=f"LazyBoost encountered an error",
+    )
+    logger.info(f"SNS response: {response}")
+
+
 def handler(event, context):
     """
     Handler function, entry point for the lambda triggers
@@ -31,30 +82,13 @@ def handler(event, context):
     logger.info(f"Starting lambda with event", event=event)
 
     try:
-        if not (
-            isinstance(event, dict)
-            and "task" in event.keys()
-            and event["task"] in ["order_sync", "review_sync", "sync"]
-        ):
+        if not (isinstance(event, dict) and "task" in event.keys() and event["task"] in TASKS):
             raise ValueError(f"Invalid event or task type used: {event}, exiting...")
 
-        if event["task"] == "order_sync":
-            OrderHandler(order_sync_type=OrdersEnum.SYNC)
-        elif event["task"] == "review_sync":
-            ReviewHandler()
-        elif event["task"] == "sync":
-            OrderHandler(order_sync_type=OrdersEnum.SYNC)
-        else:
-            raise ValueError(f"Invalid task type received: {event['task']}")
-    except Exception as e:
-        sns_topic_arn = os.getenv("SNS_ERROR_TOPIC")
-        if sns_topic_arn:
-            sns_client = boto3.client("sns")
-            response = sns_client.publish(
-                TopicArn=sns_topic_arn,
-                Message=f"An error occurred during execution of LazyBoost.\n\n" f"Error: `{e}`\n",
-                Subject=f"LazyBoost encountered an error",
-            )
-            logger.info(f"SNS response: {response}")
+        _, run_task = TASKS[event["task"]]
+        run_task(load_task_handler(event["task"]), event)
 
+        _log_client_stats()
+    except Exception as e:
+        _notify_error(e)
         raise e
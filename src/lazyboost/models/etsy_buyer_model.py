@@ -86,6 +86,22 @@ class EtsyBuyer:
             "country_code": self.address_country_code,
         }
 
+    def to_shopify_address_input(self) -> dict:
+        """
+        Buyer address as a GraphQL MailingAddressInput.
+        """
+        address = self.to_shopify_address()
+        return {
+            "address1": address["address1"],
+            "address2": address["address2"],
+            "city": address["city"],
+            "firstName": address["first_name"],
+            "lastName": address["last_name"],
+            "zip": address["zip"],
+            "provinceCode": address["province_code"],
+            "countryCode": address["country_code"],
+        }
+
     @property
     def etsy_tag(self) -> str:
         return f"ETSY_BUYER_ID_{self.user_id}"
@@ -16,15 +16,19 @@
 #
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-from lazyboost.clients import EtsyClient
 from lazyboost.models.etsy_order import EtsyOrder
 from lazyboost.models.etsy_transaction_model import EtsyTransaction
 from lazyboost.models.shopify_product_model import ShopifyMinimalProduct
 from lazyboost.utilities import constants
 from lazyboost.utilities.constants import JUDGE_ME_TIME_FORMAT
 
+if TYPE_CHECKING:
+    # imported for annotations only, EtsyClient itself decodes reviews with this model
+    from lazyboost.clients.async_etsy_client import AsyncEtsyClient
+    from lazyboost.clients.etsy_client import EtsyClient
+
 
 @dataclass
 class EtsyReview:
@@ -74,13 +78,24 @@ class EtsyReview:
             _updated_timestamp,
         )
 
-    def get_additional_info(self, etsy_client: EtsyClient):
+    def set_additional_info(self, etsy_transaction: EtsyTransaction, etsy_order: EtsyOrder):
+        self.etsy_transaction = etsy_transaction
+        self.etsy_order = etsy_order
+
+    def get_additional_info(self, etsy_client: "EtsyClient"):
         transaction_response = etsy_client.get_shop_transaction(self.transaction_id)
         self.etsy_transaction = EtsyTransaction.from_dict(transaction_response)
 
         etsy_order_response = etsy_client.get_shop_receipt(self.etsy_transaction.receipt_id)
         self.etsy_order = EtsyOrder.from_dict(etsy_order_response)
 
+    async def get_additional_info_async(self, etsy_client: "AsyncEtsyClient"):
+        transaction_response = await etsy_client.get_shop_transaction(self.transaction_id)
+        self.etsy_transaction = EtsyTransaction.from_dict(transaction_response)
+
+        etsy_order_response = await etsy_client.get_shop_receipt(self.etsy_transaction.receipt_id)
+        self.etsy_order = EtsyOrder.from_dict(etsy_order_response)
+
     def to_stamped_io_review_dict(
         self, product_sku: str, shopify_product: ShopifyMinimalProduct
     ) -> dict:
@@ -30,6 +30,7 @@ class EtsyTransaction:
     transaction_type: str
     product_id: int
     sku: str
+    create_timestamp: int
 
     @staticmethod
     def from_dict(obj: Any) -> "EtsyTransaction":
@@ -43,6 +44,7 @@ class EtsyTransaction:
         _transaction_type = str(obj.get("transaction_type"))
         _product_id = int(obj.get("product_id"))
         _sku = str(obj.get("sku"))
+        _create_timestamp = int(obj.get("create_timestamp"))
         return EtsyTransaction(
             _transaction_id,
             _title,
@@ -54,4 +56,5 @@ class EtsyTransaction:
             _transaction_type,
             _product_id,
             _sku,
+            _create_timestamp,
         )
@@ -19,7 +19,7 @@ from dataclasses import asdict, dataclass
 from typing import Any, List
 
 from lazyboost.models.etsy_buyer_model import EtsyBuyer
-from lazyboost.utilities.utility_generic import is_string_different
+from lazyboost.utilities.utility_generic import is_string_different, parse_gid
 
 
 @dataclass
@@ -97,6 +97,43 @@ class Address:
             _default,
         )
 
+    @staticmethod
+    def from_graphql(obj: Any, customer_id: int) -> "Address":
+        """
+        Build an Address from a GraphQL MailingAddress, only the fields used for matching
+        buyers are queried, the rest are left empty. Null fields become empty strings.
+        """
+
+        def _field(name: str) -> str:
+            return str(obj.get(name)) if obj.get(name) is not None else ""
+
+        return Address(
+            id=parse_gid(obj.get("id")),
+            customer_id=customer_id,
+            first_name=_field("firstName"),
+            last_name=_field("lastName"),
+            company=_field("company"),
+            address1=_field("address1"),
+            address2=_field("address2"),
+            city=_field("city"),
+            province="",
+            country="",
+            zip=_field("zip"),
+            phone=_field("phone"),
+            name="",
+            province_code=_field("provinceCode"),
+            country_code=_field("countryCodeV2"),
+            country_name="",
+            default=False,
+        )
+
+    @property
+    def gid(self) -> str:
+        """
+        GraphQL id of the customer address.
+        """
+        return f"gid://shopify/MailingAddress/{self.id}?model_name=CustomerAddress"
+
     def to_order_dict(self) -> dict:
         return {
             k: str(v)
@@ -158,3 +195,33 @@ class ShopifyCustomer:
             _addresses,
             _default_address,
         )
+
+    @staticmethod
+    def from_graphql(obj: Any) -> "ShopifyCustomer":
+        """
+        Build a ShopifyCustomer from a GraphQL Customer that only carries id, tags and addresses,
+        the fields used to match and upsert a returning buyer.
+        """
+        _id = parse_gid(obj.get("id"))
+        _tags = ", ".join(obj.get("tags") or [])
+        _addresses = [Address.from_graphql(a, _id) for a in obj.get("addresses") or []]
+        _default_address = None
+        if obj.get("defaultAddress"):
+            _default_address = Address.from_graphql(obj.get("defaultAddress"), _id)
+            _default_address.default = True
+        return ShopifyCustomer(
+            id=_id,
+            email=None,
+            first_name=None,
+            last_name=None,
+            orders_count=None,
+            state=None,
+            total_spent=None,
+            last_order_id=None,
+            tags=_tags,
+            last_order_name=None,
+            currency=None,
+            phone=None,
+            addresses=_addresses,
+            default_address=_default_address,
+        )
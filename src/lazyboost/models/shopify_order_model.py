@@ -0,0 +1,112 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from lazyboost.models.etsy_order import EtsyOrder
+
+
+@dataclass
+class ShopifyOrderResult:
+    receipt_id: int
+    order_id: Optional[int] = None
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def is_success(self) -> bool:
+        return self.order_id is not None and not self.errors
+
+
+def _money(amount: float, currency_code: str = "USD") -> dict:
+    return {"shopMoney": {"amount": str(round(amount, 2)), "currencyCode": currency_code}}
+
+
+def to_order_create_input(
+    etsy_order: EtsyOrder, customer_id: int, variant_ids: dict, currency_code: str = "USD"
+) -> dict:
+    """
+    Converts an EtsyOrder to a GraphQL OrderCreateOrderInput.
+    :param etsy_order: EtsyOrder, receipt to create the order for.
+    :param customer_id: int, Shopify customer id of the buyer.
+    :param variant_ids: dict, SKU to Shopify variant id, SKUs without a variant become custom items.
+    :param currency_code: str, currency of all amounts.
+    """
+    line_items = []
+    for t in etsy_order.transactions:
+        line_item = {
+            "sku": t.product_sku,
+            "quantity": t.product_quantity,
+            "requiresShipping": True,
+            "priceSet": _money(t.product_price, currency_code),
+            "properties": (
+                [{"name": "message", "value": etsy_order.message_from_buyer}]
+                if etsy_order.message_from_buyer
+                else []
+            ),
+        }
+        if variant_ids.get(t.product_sku):
+            line_item["variantId"] = f"gid://shopify/ProductVariant/{variant_ids[t.product_sku]}"
+        else:
+            line_item["title"] = t.product_sku
+        line_items.append(line_item)
+
+    order_input = {
+        "email": etsy_order.buyer.email,
+        "billingAddress": etsy_order.buyer.to_shopify_address_input(),
+        "shippingAddress": etsy_order.buyer.to_shopify_address_input(),
+        "customer": {"toAssociate": {"id": f"gid://shopify/Customer/{customer_id}"}},
+        "currency": currency_code,
+        "financialStatus": "PAID",
+        "lineItems": line_items,
+        "note": f"Gift Message: {etsy_order.gift_message}" if etsy_order.is_gift else "",
+        "shippingLines": [
+            {
+                "title": "Standard Shipping",
+                "priceSet": _money(etsy_order.sale_shipping_cost, currency_code),
+            }
+        ],
+        "sourceName": "Etsy",
+        "sourceIdentifier": str(etsy_order.receipt_id),
+        "tags": ["LazyBoost", f"ETSY_{etsy_order.receipt_id}"],
+        "taxLines": [
+            {
+                "title": "Etsy Sales Tax",
+                "priceSet": _money(etsy_order.sale_tax_cost, currency_code),
+                "rate": (
+                    round(etsy_order.sale_tax_cost / etsy_order.sale_subtotal_cost, 2)
+                    if etsy_order.sale_subtotal_cost
+                    else 0
+                ),
+            }
+        ],
+        "transactions": [
+            {
+                "kind": "SALE",
+                "status": "SUCCESS",
+                "gateway": "Etsy Checkout",
+                "amountSet": _money(etsy_order.sale_total_cost, currency_code),
+            }
+        ],
+    }
+    if etsy_order.sale_discount_cost:
+        order_input["discountCode"] = {
+            "itemFixedDiscountCode": {
+                "code": "ETSY",
+                "amountSet": _money(etsy_order.sale_discount_cost, currency_code),
+            }
+        }
+    return order_input
@@ -15,9 +15,9 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 import re
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from datetime import datetime
-from typing import Any, List
+from typing import Any, List, Optional
 
 from lazyboost.utilities.constants import ETSY_RETURN_POLICY_ID
 from lazyboost.utilities.utility_etsy import (
@@ -47,10 +47,40 @@ class ShopifyMinimalProduct:
         _title = str(obj.get("title"))
         _online_store_url = str(obj.get("onlineStoreUrl"))
         _handle = str(obj.get("handle"))
-        _featured_image_url = dict(obj.get("featuredImage"))["url"]
+        _featured_image_url = dict(obj.get("featuredImage") or {}).get("url")
         return ShopifyMinimalProduct(_id, _title, _online_store_url, _handle, _featured_image_url)
 
 
+@dataclass
+class ShopifySkuInfo:
+    sku: str
+    variant_id: Optional[str]
+    product: Optional[ShopifyMinimalProduct]
+
+    @property
+    def found(self) -> bool:
+        return self.variant_id is not None
+
+    @staticmethod
+    def from_dict(obj: Any) -> "ShopifySkuInfo":
+        _sku = str(obj.get("sku"))
+        _variant_id = str(obj.get("id")).rsplit("/", 1)[-1]
+        _product = ShopifyMinimalProduct.from_dict(obj.get("product"))
+        return ShopifySkuInfo(_sku, _variant_id, _product)
+
+    @staticmethod
+    def not_found(sku: str) -> "ShopifySkuInfo":
+        return ShopifySkuInfo(sku, None, None)
+
+    @staticmethod
+    def from_cache_dict(obj: dict) -> "ShopifySkuInfo":
+        _product = ShopifyMinimalProduct(**obj["product"]) if obj.get("product") else None
+        return ShopifySkuInfo(obj["sku"], obj.get("variant_id"), _product)
+
+    def to_cache_dict(self) -> dict:
+        return asdict(self)
+
+
 @dataclass
 class ShopifyVariant:
     id: str
@@ -140,3 +170,24 @@ class ShopifyListing:
             "shop_section_id": get_section_id(self.tags),
             "materials": format_materials_to_list(self.description),
         }
+
+    @staticmethod
+    def to_etsy_listing_inventory(etsy_listing: dict) -> dict:
+        """
+        Converts the inventory fields of an Etsy listing payload to an Etsy inventory update
+        """
+        return {
+            "products": [
+                {
+                    "sku": etsy_listing["sku"],
+                    "property_values": [],
+                    "offerings": [
+                        {
+                            "price": etsy_listing["price"],
+                            "quantity": etsy_listing["quantity"],
+                            "is_enabled": True,
+                        }
+                    ],
+                }
+            ]
+        }
@@ -0,0 +1,245 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+checkpoint_store module records the high-water mark of every incremental sync stream.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from aws_lambda_powertools import Logger
+from botocore.exceptions import ClientError
+
+from lazyboost.utilities import constants
+
+if TYPE_CHECKING:
+    from lazyboost.clients.secret_manager_client import SecretManagerClient
+
+logger = Logger()
+
+
+class CheckpointStore(ABC):
+    """
+    Epoch second high-water marks per stream, up to which a sync completed successfully.
+    Checkpoints only ever move forward.
+    """
+
+    @abstractmethod
+    def get(self, stream: str) -> Optional[int]:
+        """
+        :param stream: str, name of the sync stream.
+        :return: int, checkpoint of the stream, None if the stream never completed a sync.
+        """
+
+    @abstractmethod
+    def advance(self, stream: str, timestamp: int):
+        """
+        Move the checkpoint of a stream forward, older timestamps are ignored.
+        :param stream: str, name of the sync stream.
+        :param timestamp: int, epoch seconds up to which the stream is synced.
+        """
+
+    def sync_window(
+        self, stream: str, default_interval_minutes: int, overlap: int = 0
+    ) -> Tuple[int, int]:
+        """
+        Window a sync run of the stream should query, from its checkpoint up to now.
+        Streams without a checkpoint fall back to the last default_interval_minutes.
+        :param stream: str, name of the sync stream.
+        :param default_interval_minutes: int, look back of the first sync.
+        :param overlap: int, seconds re-queried before the checkpoint, for late arriving data.
+        :return: tuple, (start, end) in epoch seconds, both inclusive.
+        """
+        end = int(time.time())
+        checkpoint = self.get(stream)
+        if checkpoint is None:
+            start = int((datetime.now() - timedelta(minutes=default_interval_minutes)).timestamp())
+            logger.info(f"No checkpoint for {stream}, syncing the last {default_interval_minutes}m")
+        else:
+            start = checkpoint + 1 - overlap
+            logger.info(f"Syncing {stream} from checkpoint {checkpoint}")
+        return min(start, end), end
+
+
+class FileCheckpointStore(CheckpointStore):
+    """
+    Checkpoints in a json file, replaced atomically on every advance.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, int]:
+        try:
+            with open(self.path) as checkpoint_file:
+                return json.load(checkpoint_file)
+        except FileNotFoundError:
+            return {}
+
+    def get(self, stream: str) -> Optional[int]:
+        with self._lock:
+            return self._read().get(stream)
+
+    def advance(self, stream: str, timestamp: int):
+        with self._lock:
+            checkpoints = self._read()
+            if checkpoints.get(stream, 0) >= timestamp:
+                return
+            checkpoints[stream] = int(timestamp)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as checkpoint_file:
+                json.dump(checkpoints, checkpoint_file)
+            os.replace(tmp_path, self.path)
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """
+    Checkpoints in a SQLite table, advanced in a single conditional upsert.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints "
+                "(stream TEXT PRIMARY KEY, timestamp INTEGER NOT NULL, updated_at INTEGER NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, stream: str) -> Optional[int]:
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT timestamp FROM checkpoints WHERE stream = ?", (stream,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def advance(self, stream: str, timestamp: int):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO checkpoints (stream, timestamp, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (stream) DO UPDATE SET "
+                "timestamp = excluded.timestamp, updated_at = excluded.updated_at "
+                "WHERE excluded.timestamp > checkpoints.timestamp",
+                (stream, int(timestamp), int(time.time())),
+            )
+
+
+class DynamoDBCheckpointStore(CheckpointStore):
+    """
+    Checkpoints as items in the LazyBoost state table, advanced with a conditional update that
+    only succeeds when it moves the checkpoint forward.
+    """
+
+    def __init__(self, table_name: str):
+        import boto3
+
+        self.client = boto3.client("dynamodb")
+        self.table_name = table_name
+
+    @staticmethod
+    def _key(stream: str) -> dict:
+        return {"pk": {"S": f"{constants.CHECKPOINT_ITEM_PREFIX}{stream}"}}
+
+    def get(self, stream: str) -> Optional[int]:
+        item = self.client.get_item(
+            TableName=self.table_name, Key=self._key(stream), ConsistentRead=True
+        ).get("Item")
+        return int(item["timestamp"]["N"]) if item else None
+
+    def advance(self, stream: str, timestamp: int):
+        try:
+            self.client.update_item(
+                TableName=self.table_name,
+                Key=self._key(stream),
+                UpdateExpression="SET #ts = :ts, updated_at = :now",
+                ConditionExpression="attribute_not_exists(#ts) OR #ts < :ts",
+                ExpressionAttributeNames={"#ts": "timestamp"},
+                ExpressionAttributeValues={
+                    ":ts": {"N": str(int(timestamp))},
+                    ":now": {"N": str(int(time.time()))},
+                },
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+
+class SecretCheckpointStore(CheckpointStore):
+    """
+    Checkpoints kept in the LazyBoost secret, which outlives the ephemeral storage of Lambda.
+    Every write creates a secret version, so the secret is only written once a checkpoint moved
+    at least min_advance seconds past its last written value. Smaller steps are kept in memory
+    and re-synced after a restart.
+    """
+
+    def __init__(self, sm_client: "SecretManagerClient", key: str = None, min_advance: int = None):
+        self.sm_client = sm_client
+        self.key = key or constants.CHECKPOINT_SECRET_KEY
+        self.min_advance = (
+            constants.CHECKPOINT_SECRET_MIN_ADVANCE_SEC if min_advance is None else min_advance
+        )
+        self._written: Dict[str, int] = {}
+
+    def get(self, stream: str) -> Optional[int]:
+        return (self.sm_client.get_secret_variables().get(self.key) or {}).get(stream)
+
+    def advance(self, stream: str, timestamp: int):
+        checkpoints = self.sm_client.secret_variables.setdefault(self.key, {})
+        current = checkpoints.get(stream, 0)
+        if current >= timestamp:
+            return
+        written = self._written.setdefault(stream, current)
+        checkpoints[stream] = int(timestamp)
+        if written and timestamp - written < self.min_advance:
+            logger.debug(f"Checkpoint {stream} moved {timestamp - written}s, not written yet")
+            return
+        self.sm_client.update_secret_manager()
+        self._written[stream] = int(timestamp)
+
+
+def checkpoint_store_from_env(sm_client: "SecretManagerClient" = None) -> CheckpointStore:
+    """
+    Checkpoint store selected by CHECKPOINT_BACKEND, "sqlite" (default), "file", "dynamodb" or
+    "secret".
+    """
+    backend = os.getenv("CHECKPOINT_BACKEND", "sqlite").lower()
+    if backend == "sqlite":
+        return SQLiteCheckpointStore(os.getenv("CHECKPOINT_PATH", constants.CHECKPOINT_DB_PATH))
+    if backend == "file":
+        return FileCheckpointStore(os.getenv("CHECKPOINT_PATH", constants.CHECKPOINT_FILE_PATH))
+    if backend == "dynamodb":
+        table_name = os.getenv("LAZYBOOST_STATE_TABLE")
+        if not table_name:
+            raise ValueError(
+                "LAZYBOOST_STATE_TABLE is required for the dynamodb checkpoint backend"
+            )
+        return DynamoDBCheckpointStore(table_name)
+    if backend == "secret":
+        if sm_client is None:
+            from lazyboost.clients.secret_manager_client import SecretManagerClient
+
+            sm_client = SecretManagerClient()
+        return SecretCheckpointStore(sm_client)
+    raise ValueError(f"Unknown checkpoint backend: {backend}")
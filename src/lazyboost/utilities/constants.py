@@ -29,6 +29,20 @@ ETSY_AUTH_URL = "https://www.etsy.com/oauth/connect"
 ETSY_TOKEN_URL = "https://openapi.etsy.com/v3/public/oauth/token"
 ETSY_AUTH_BASE_URL = "https://openapi.etsy.com/v3"
 ETSY_API_BASE_URL = "https://openapi.etsy.com/v3/application/"
+# max page size accepted by Etsy list endpoints
+ETSY_PAGE_LIMIT = 100
+# Etsy rate limits, used until the quota headers of a response are seen
+ETSY_DEFAULT_LIMIT_PER_SECOND = 10
+ETSY_LOW_DAILY_QUOTA = 500
+ETSY_MAX_THROTTLE_RETRIES = 3
+# seconds to wait before retrying a failed proactive token refresh
+ETSY_TOKEN_REFRESH_BACKOFF = 60
+# one process refreshes the tokens at a time, the others wait for it and re-read the secret
+ETSY_TOKEN_LEASE_KEY = "lease#etsy_token_refresh"
+ETSY_TOKEN_LEASE_PATH = "/tmp/lazyboost-etsy-token.lock"
+ETSY_TOKEN_LEASE_TTL_SEC = 30
+ETSY_TOKEN_LEASE_WAIT_SEC = 5
+ETSY_TOKEN_LEASE_POLL_SEC = 0.5
 
 # Stamped.io constants
 STAMPED_IO_BASE_URL = "https://stamped.io/api"
@@ -38,6 +52,11 @@ JUDGE_ME_BASE_URL = "https://judge.me/api/v1"
 JUDGE_ME_REVIEW_PLATFORM = "shopify"
 JUDGE_ME_REVIEW_NAME_FORMAT = ""
 JUDGE_ME_TIME_FORMAT = "%Y-%m-%d %H:%M:%S %Z"
+# reviews buffered per bulk publish and sent concurrently, there is no batch endpoint
+JUDGE_ME_BATCH_SIZE = 50
+JUDGE_ME_MAX_CONCURRENCY = 8
+# reviews that failed to publish are exported there for a manual Judge.me import
+REVIEW_EXPORT_DIR = "."
 
 # Ref: https://www.shopuploader.com/tools/etsy-product-category-taxonomy
 # Home & Living > Home Decor > Ornaments & Accents - #1023
@@ -73,3 +92,65 @@ ETSY_SECTION_ID_DICT = {
 ETSY_RETURN_POLICY_ID = 1097280283271
 
 # SHOPIFY constants
+# SKUs resolved per productVariants query, keeps the requested query cost well below 1000
+SHOPIFY_SKU_BATCH_SIZE = 50
+# pages of fuzzy SKU matches to follow before giving up on a batch
+SHOPIFY_SKU_MAX_PAGES = 5
+SHOPIFY_SKU_CACHE_PATH = "/tmp/lazyboost-sku-cache.json"
+# receipt tags checked per orders query
+SHOPIFY_ORDER_TAG_BATCH_SIZE = 50
+# Shopify GraphQL leaky bucket defaults, replaced by the throttleStatus of the first response
+SHOPIFY_DEFAULT_MAXIMUM_AVAILABLE = 1000
+SHOPIFY_DEFAULT_RESTORE_RATE = 50
+SHOPIFY_DEFAULT_QUERY_COST = 50
+SHOPIFY_MAX_THROTTLE_RETRIES = 3
+# a single query may not request more points, whatever the bucket holds
+SHOPIFY_MAX_QUERY_COST = 1000
+# preferred products per page, shrunk when the reported query cost gets too high
+SHOPIFY_PRODUCT_PAGE_SIZE = 25
+SHOPIFY_VARIANT_PAGE_SIZE = 10
+# every mutation requests 10 points, orders created per aliased orderCreate request
+SHOPIFY_MUTATION_COST = 10
+SHOPIFY_ORDER_CREATE_BATCH_SIZE = 5
+
+# decoded secret is re-validated against its AWSCURRENT version once the TTL is up
+SECRET_CACHE_TTL_SEC = 300
+SECRET_CACHE_PATH = "/tmp/lazyboost-secret-cache"
+# staging label of a written version until it is swapped in as AWSCURRENT
+SECRET_PENDING_STAGE = "LAZYBOOST_PENDING"
+SECRET_MAX_WRITE_RETRIES = 3
+
+# high-water marks of the incremental sync streams
+CHECKPOINT_DB_PATH = "/tmp/lazyboost-checkpoints.db"
+CHECKPOINT_FILE_PATH = "/tmp/lazyboost-checkpoints.json"
+CHECKPOINT_SECRET_KEY = "LAZYBOOST_CHECKPOINTS"
+# every secret write is a new version, smaller checkpoint moves are only kept in memory
+CHECKPOINT_SECRET_MIN_ADVANCE_SEC = 3600
+CHECKPOINT_ITEM_PREFIX = "checkpoint#"
+CHECKPOINT_STREAM_ETSY_RECEIPTS = "etsy_receipts"
+CHECKPOINT_STREAM_ETSY_REVIEWS = "etsy_reviews"
+# receipts are de-duplicated against Shopify, re-query a little for late arriving updates
+CHECKPOINT_RECEIPTS_OVERLAP_SEC = 60
+
+# idempotency ledger of synced items, a miss falls back to checking remotely
+SYNC_LEDGER_DB_PATH = "/tmp/lazyboost-sync-ledger.db"
+SYNC_LEDGER_FILE_PATH = "/tmp/lazyboost-sync-ledger.json"
+SYNC_LEDGER_ETSY_RECEIPT = "etsy_receipt"
+SYNC_LEDGER_ETSY_REVIEW = "etsy_review"
+# listing snapshots of Shopify variants, listing fields and inventory are diffed separately
+SYNC_LEDGER_SHOPIFY_VARIANT_LISTING = "shopify_variant_listing"
+SYNC_LEDGER_SHOPIFY_VARIANT_INVENTORY = "shopify_variant_inventory"
+SYNC_LEDGER_SHOPIFY_VARIANT_STATE = "shopify_variant_state"
+# listing snapshots have no remote fallback, they are kept out of the temporary directory
+LISTING_SNAPSHOT_DB_PATH = "~/.lazyboost/listing-snapshots.db"
+ETSY_LISTING_INVENTORY_FIELDS = ("price", "quantity", "sku")
+ETSY_LISTING_STATE_ACTIVE = "active"
+ETSY_LISTING_STATE_INACTIVE = "inactive"
+# listing states searched for the SKU of a variant without a snapshot
+ETSY_LISTING_STATES = ("active", "inactive", "sold_out", "draft", "expired")
+
+# receipts of different buyers synced concurrently
+ORDER_SYNC_WORKERS = 4
+
+# items buffered between two pipeline stages before the upstream stage blocks
+PIPELINE_QUEUE_SIZE = 100
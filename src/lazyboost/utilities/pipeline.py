@@ -0,0 +1,267 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+pipeline module runs sync work as streaming stages connected by bounded queues.
+"""
+import queue
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+from aws_lambda_powertools import Logger
+
+from lazyboost.utilities import constants
+
+logger = Logger()
+
+_END = object()
+
+
+@dataclass
+class StageStats:
+    items_in: int = 0
+    items_out: int = 0
+    busy_sec: float = 0.0
+    wall_sec: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """
+        Items processed per second of wall time.
+        """
+        return self.items_in / self.wall_sec if self.wall_sec else 0.0
+
+    def to_dict(self) -> dict:
+        stats = {k: round(v, 3) if isinstance(v, float) else v for k, v in asdict(self).items()}
+        stats["throughput_per_sec"] = round(self.throughput, 2)
+        return stats
+
+
+class _Stage:
+    def __init__(
+        self,
+        name: str,
+        process: Callable[[List[Any]], Iterable[Any]],
+        workers: int,
+        batch_size: int,
+        key: Optional[Callable[[Any], Hashable]],
+        queue_size: int,
+    ):
+        self.name = name
+        self.process = process
+        self.workers = workers
+        self.batch_size = batch_size
+        self.key = key
+        # keyed stages give every worker its own queue, so equal keys stay in order
+        self.inboxes = [queue.Queue(maxsize=queue_size) for _ in range(workers if key else 1)]
+        self.stats = StageStats()
+        self._lock = threading.Lock()
+        self._running_workers = workers
+        self._started_at: Optional[float] = None
+
+    def inbox_for(self, item: Any) -> queue.Queue:
+        if not self.key:
+            return self.inboxes[0]
+        return self.inboxes[hash(self.key(item)) % len(self.inboxes)]
+
+
+class Pipeline:
+    """
+    A source followed by stages, each running on its own threads and reading from a bounded
+    queue, so a slow stage applies backpressure upstream while the others keep working, e.g.
+    the next page is fetched while the current one is being written.
+    Stages either map single items, with several workers and optionally keyed so that items
+    with equal keys are processed by the same worker in order, or process batches of items.
+    An exception in any stage stops the pipeline and is raised by run(). Stages that should
+    survive failing items handle them themselves.
+    """
+
+    def __init__(self, name: str, queue_size: int = None):
+        self.name = name
+        self.queue_size = queue_size or constants.PIPELINE_QUEUE_SIZE
+        self._source: Optional[Callable[[], Iterable[Any]]] = None
+        self._source_stats = StageStats()
+        self._stages: List[_Stage] = []
+        self._abort = threading.Event()
+        self._errors: List[BaseException] = []
+
+    def source(self, produce: Callable[[], Iterable[Any]]) -> "Pipeline":
+        """
+        :param produce: callable, returns the iterable of items fed into the pipeline.
+        """
+        self._source = produce
+        return self
+
+    def map(
+        self,
+        name: str,
+        fn: Callable[[Any], Any],
+        workers: int = 1,
+        key: Callable[[Any], Hashable] = None,
+    ) -> "Pipeline":
+        """
+        Stage turning every item into one output item, None drops the item.
+        :param name: str, stage name in the stats.
+        :param fn: callable, processes a single item.
+        :param workers: int, items processed concurrently.
+        :param key: callable, items with equal keys are processed in order by one worker.
+        """
+
+        def process(items: List[Any]) -> Iterable[Any]:
+            return [output for output in (fn(items[0]),) if output is not None]
+
+        return self._add(name, process, workers, 1, key)
+
+    def batch(self, name: str, fn: Callable[[List[Any]], Iterable[Any]], size: int) -> "Pipeline":
+        """
+        Stage processing up to size items at once, e.g. for batched API calls.
+        :param name: str, stage name in the stats.
+        :param fn: callable, processes a list of items and returns the output items.
+        :param size: int, items per batch, the last batch may be smaller.
+        """
+        return self._add(name, fn, 1, size, None)
+
+    def _add(self, name, process, workers, batch_size, key) -> "Pipeline":
+        self._stages.append(_Stage(name, process, workers, batch_size, key, self.queue_size))
+        return self
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        Items, busy time, wall time and throughput per stage.
+        """
+        stats = {"source": self._source_stats.to_dict()}
+        stats.update({stage.name: stage.stats.to_dict() for stage in self._stages})
+        return stats
+
+    def run(self) -> Dict[str, dict]:
+        """
+        Run the pipeline until the source is exhausted and every stage is drained.
+        :return: dict, stats per stage.
+        """
+        threads = [threading.Thread(target=self._run_source, name=f"{self.name}-source")]
+        for index, stage in enumerate(self._stages):
+            threads.extend(
+                threading.Thread(
+                    target=self._run_worker,
+                    args=(index, stage.inboxes[worker % len(stage.inboxes)]),
+                    name=f"{self.name}-{stage.name}-{worker}",
+                )
+                for worker in range(stage.workers)
+            )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        logger.info(f"Pipeline {self.name} finished", pipeline_stats=self.stats())
+        if self._errors:
+            raise self._errors[0]
+        return self.stats()
+
+    def _put(self, target: queue.Queue, item: Any) -> bool:
+        while not self._abort.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue) -> Any:
+        while not self._abort.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _emit(self, index: int, items: Iterable[Any]) -> int:
+        emitted = 0
+        for item in items:
+            if index < len(self._stages):
+                if not self._put(self._stages[index].inbox_for(item), item):
+                    break
+            emitted += 1
+        return emitted
+
+    def _close(self, index: int):
+        if index >= len(self._stages):
+            return
+        stage = self._stages[index]
+        for worker in range(stage.workers):
+            self._put(stage.inboxes[worker % len(stage.inboxes)], _END)
+
+    def _fail(self, where: str, error: BaseException):
+        logger.exception(f"Pipeline {self.name} failed in {where}: {error}")
+        self._errors.append(error)
+        self._abort.set()
+
+    def _run_source(self):
+        started_at = time.perf_counter()
+        try:
+            emitted = 0
+            for item in self._source():
+                if not self._emit(0, [item]):
+                    break
+                emitted += 1
+            self._source_stats.items_in = self._source_stats.items_out = emitted
+        except Exception as e:
+            self._fail("source", e)
+        finally:
+            self._source_stats.wall_sec = time.perf_counter() - started_at
+            self._close(0)
+
+    def _run_worker(self, index: int, inbox: queue.Queue):
+        stage = self._stages[index]
+        with stage._lock:
+            if stage._started_at is None:
+                stage._started_at = time.perf_counter()
+
+        pending: List[Any] = []
+
+        def flush():
+            busy_started_at = time.perf_counter()
+            outputs = list(stage.process(pending))
+            busy = time.perf_counter() - busy_started_at
+            emitted = self._emit(index + 1, outputs)
+            with stage._lock:
+                stage.stats.items_in += len(pending)
+                stage.stats.items_out += emitted
+                stage.stats.busy_sec += busy
+            pending.clear()
+
+        try:
+            while True:
+                item = self._get(inbox)
+                if item is _END:
+                    break
+                pending.append(item)
+                if len(pending) >= stage.batch_size:
+                    flush()
+            if pending and not self._abort.is_set():
+                flush()
+        except Exception as e:
+            self._fail(stage.name, e)
+        finally:
+            with stage._lock:
+                stage._running_workers -= 1
+                is_last_worker = stage._running_workers == 0
+                if is_last_worker:
+                    stage.stats.wall_sec = time.perf_counter() - stage._started_at
+            if is_last_worker:
+                self._close(index + 1)
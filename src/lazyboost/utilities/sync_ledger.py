@@ -0,0 +1,191 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+sync_ledger module remembers which Etsy items were already synced, and what they became.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, is_dataclass
+from typing import Any, Dict, Iterable, Optional
+
+from aws_lambda_powertools import Logger
+
+from lazyboost.utilities import constants
+
+logger = Logger()
+
+
+@dataclass
+class LedgerEntry:
+    kind: str
+    key: str
+    remote_id: Optional[str]
+    content_hash: str
+    synced_at: int
+
+
+def content_hash(content: Any) -> str:
+    """
+    Stable hash of a model or json serializable value.
+    """
+    if is_dataclass(content):
+        content = asdict(content)
+    serialized = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+class SyncLedger(ABC):
+    """
+    Idempotency ledger of synced items, keyed by kind and source id, e.g. an Etsy receipt id.
+    Every entry records the id of the item created remotely and a hash of the synced content.
+    """
+
+    @abstractmethod
+    def get_many(self, kind: str, keys: Iterable[Any]) -> Dict[str, LedgerEntry]:
+        """
+        :param kind: str, kind of the synced items.
+        :param keys: iterable, source ids to look up.
+        :return: dict, source id (as str) to entry, for the ids that were synced before.
+        """
+
+    @abstractmethod
+    def record(self, kind: str, key: Any, remote_id: Optional[Any], content: Any):
+        """
+        Record a synced item, replacing a previous entry.
+        :param kind: str, kind of the synced item.
+        :param key: source id of the item.
+        :param remote_id: id of the item created remotely, if known.
+        :param content: synced content, only its hash is stored.
+        """
+
+    def get(self, kind: str, key: Any) -> Optional[LedgerEntry]:
+        return self.get_many(kind, [key]).get(str(key))
+
+
+class SQLiteSyncLedger(SyncLedger):
+    """
+    Ledger in a SQLite table with one row per kind and source id.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sync_ledger (kind TEXT NOT NULL, key TEXT NOT NULL, "
+                "remote_id TEXT, content_hash TEXT NOT NULL, synced_at INTEGER NOT NULL, "
+                "PRIMARY KEY (kind, key))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, kind: str, keys: Iterable[Any]) -> Dict[str, LedgerEntry]:
+        keys = list({str(key) for key in keys})
+        entries = {}
+        with self._connect() as connection:
+            # stay below the host parameter limit of older SQLite builds
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                rows = connection.execute(
+                    "SELECT kind, key, remote_id, content_hash, synced_at FROM sync_ledger "
+                    f"WHERE kind = ? AND key IN ({', '.join('?' * len(batch))})",
+                    (kind, *batch),
+                )
+                entries.update({row[1]: LedgerEntry(*row) for row in rows})
+        return entries
+
+    def record(self, kind: str, key: Any, remote_id: Optional[Any], content: Any):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO sync_ledger "
+                "(kind, key, remote_id, content_hash, synced_at) VALUES (?, ?, ?, ?, ?)",
+                (
+                    kind,
+                    str(key),
+                    None if remote_id is None else str(remote_id),
+                    content_hash(content),
+                    int(time.time()),
+                ),
+            )
+
+
+class FileSyncLedger(SyncLedger):
+    """
+    Ledger in a json file, replaced atomically on every record.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Dict[str, dict]]:
+        try:
+            with open(self.path) as ledger_file:
+                return json.load(ledger_file)
+        except FileNotFoundError:
+            return {}
+
+    def get_many(self, kind: str, keys: Iterable[Any]) -> Dict[str, LedgerEntry]:
+        with self._lock:
+            entries = self._read().get(kind, {})
+        return {str(key): LedgerEntry(**entries[str(key)]) for key in keys if str(key) in entries}
+
+    def record(self, kind: str, key: Any, remote_id: Optional[Any], content: Any):
+        entry = LedgerEntry(
+            kind,
+            str(key),
+            None if remote_id is None else str(remote_id),
+            content_hash(content),
+            int(time.time()),
+        )
+        with self._lock:
+            ledger = self._read()
+            ledger.setdefault(kind, {})[entry.key] = asdict(entry)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as ledger_file:
+                json.dump(ledger, ledger_file)
+            os.replace(tmp_path, self.path)
+
+
+def sync_ledger_from_env() -> SyncLedger:
+    """
+    Sync ledger selected by SYNC_LEDGER_BACKEND, "sqlite" (default) or "file".
+    """
+    backend = os.getenv("SYNC_LEDGER_BACKEND", "sqlite").lower()
+    if backend == "sqlite":
+        return SQLiteSyncLedger(os.getenv("SYNC_LEDGER_PATH", constants.SYNC_LEDGER_DB_PATH))
+    if backend == "file":
+        return FileSyncLedger(os.getenv("SYNC_LEDGER_PATH", constants.SYNC_LEDGER_FILE_PATH))
+    raise ValueError(f"Unknown sync ledger backend: {backend}")
+
+
+def listing_snapshot_path() -> str:
+    """
+    Path of the listing snapshot database, LISTING_SNAPSHOT_PATH or a file in the home directory.
+    Unlike the sync ledger it must survive restarts, a lost snapshot is only recovered by
+    searching the Etsy listings.
+    """
+    path = os.path.expanduser(
+        os.getenv("LISTING_SNAPSHOT_PATH", constants.LISTING_SNAPSHOT_DB_PATH)
+    )
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return path
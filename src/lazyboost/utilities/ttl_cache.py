@@ -0,0 +1,144 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+
+class TTLCache:
+    """
+    Bounded LRU cache with a time to live per entry. Entries stored as negative (a remembered
+    miss) expire after the shorter negative_ttl. The cache can be persisted to a json file, so a
+    new process on a warm host starts with the entries of the previous one.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        negative_ttl: float,
+        persist_path: Optional[str] = None,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.persist_path = persist_path
+        self.hits = 0
+        self.misses = 0
+        # key -> (expires_at, is_negative, value)
+        self._entries: "OrderedDict[Hashable, Tuple[float, bool, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Look up a key.
+        :return: tuple, (True, value) on a hit, value is None for a remembered miss,
+                 (False, None) if the key is not cached or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, None if entry[1] else entry[2]
+
+    def put(self, key: Hashable, value: Any, negative: bool = False):
+        """
+        Cache a value, or remember a miss for the key when negative is set.
+        """
+        expires_at = time.time() + (self.negative_ttl if negative else self.ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, negative, None if negative else value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> bool:
+        """
+        Drop a key, the persisted file only changes on the next save.
+        :return: bool, True if the key was cached.
+        """
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def load(self, decoder: Callable[[Any], Any]):
+        """
+        Load unexpired entries from persist_path, if it exists.
+        :param decoder: callable, turns a persisted value back into the cached object.
+        """
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "r") as cache_file:
+                persisted = json.load(cache_file)
+        except (OSError, ValueError):
+            logger.warning(f"Ignoring unreadable cache file {self.persist_path}")
+            return
+
+        now = time.time()
+        try:
+            entries = [
+                (key, (expires_at, negative, None if negative else decoder(value)))
+                for key, expires_at, negative, value in persisted
+                if expires_at > now
+            ]
+        except Exception as e:
+            # a cache file of an older format is as good as none
+            logger.warning(f"Ignoring undecodable cache file {self.persist_path}: {e}")
+            return
+
+        with self._lock:
+            self._entries.update(entries)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        logger.debug(f"Loaded {len(self._entries)} cache entries from {self.persist_path}")
+
+    def save(self, encoder: Callable[[Any], Any]):
+        """
+        Atomically write all entries to persist_path.
+        :param encoder: callable, turns a cached object into a json serializable value.
+        """
+        if not self.persist_path:
+            return
+        with self._lock:
+            persisted = [
+                [key, expires_at, negative, None if negative else encoder(value)]
+                for key, (expires_at, negative, value) in self._entries.items()
+            ]
+        try:
+            tmp_path = f"{self.persist_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as cache_file:
+                json.dump(persisted, cache_file)
+            os.replace(tmp_path, self.persist_path)
+        except OSError:
+            logger.warning(f"Could not persist cache to {self.persist_path}")
@@ -0,0 +1,39 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+import asyncio
+from typing import Awaitable, Iterable, List
+
+
+async def gather_bounded(
+    awaitables: Iterable[Awaitable], limit: int, return_exceptions: bool = False
+) -> List:
+    """
+    Await all awaitables concurrently, with at most `limit` of them in flight at a time.
+    Results are returned in the order of the input, like asyncio.gather.
+    :param awaitables: iterable of coroutines or futures to await.
+    :param limit: int, maximum number of awaitables running at the same time.
+    :param return_exceptions: bool, return exceptions as results instead of raising the first.
+    """
+    semaphore = asyncio.Semaphore(max(limit, 1))
+
+    async def _bounded(awaitable: Awaitable):
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(
+        *(_bounded(a) for a in awaitables), return_exceptions=return_exceptions
+    )
@@ -20,3 +20,11 @@ def is_string_different(string1: str, string2: str) -> bool:
     Compares two strings, returns True if they are the different, False otherwise.
     """
     return string1.rstrip().casefold() != string2.rstrip().casefold()
+
+
+def parse_gid(gid: str) -> int:
+    """
+    Extract the numeric id of a Shopify GraphQL global id, e.g.
+    gid://shopify/MailingAddress/123?model_name=CustomerAddress -> 123
+    """
+    return int(str(gid).rsplit("/", 1)[-1].split("?", 1)[0])
@@ -0,0 +1,127 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+Tests for the checkpoint_store module.
+"""
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+from lazyboost.utilities.checkpoint_store import (
+    DynamoDBCheckpointStore,
+    FileCheckpointStore,
+    SecretCheckpointStore,
+    SQLiteCheckpointStore,
+)
+
+
+class FakeSecretManagerClient:
+    def __init__(self):
+        self.secret_variables = {}
+        self.updates = 0
+
+    def get_secret_variables(self):
+        return self.secret_variables
+
+    def update_secret_manager(self):
+        self.updates += 1
+
+
+class FakeDynamoDBClient:
+    """
+    Evaluates the only condition the checkpoint store uses, a forward move of the timestamp.
+    """
+
+    def __init__(self):
+        self.items = {}
+
+    def get_item(self, TableName, Key, ConsistentRead):
+        item = self.items.get(Key["pk"]["S"])
+        return {"Item": item} if item else {}
+
+    def update_item(self, TableName, Key, ExpressionAttributeValues, **kwargs):
+        item = self.items.setdefault(Key["pk"]["S"], {})
+        timestamp = ExpressionAttributeValues[":ts"]
+        if "timestamp" in item and int(item["timestamp"]["N"]) >= int(timestamp["N"]):
+            raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+        item["timestamp"] = timestamp
+
+
+@pytest.fixture(params=["file", "sqlite", "dynamodb", "secret"])
+def store(request, tmp_path):
+    if request.param == "file":
+        return FileCheckpointStore(str(tmp_path / "checkpoints.json"))
+    if request.param == "sqlite":
+        return SQLiteCheckpointStore(str(tmp_path / "checkpoints.db"))
+    if request.param == "dynamodb":
+        dynamodb_store = object.__new__(DynamoDBCheckpointStore)
+        dynamodb_store.client = FakeDynamoDBClient()
+        dynamodb_store.table_name = "lazyboost-state"
+        return dynamodb_store
+    return SecretCheckpointStore(FakeSecretManagerClient())
+
+
+def test_missing_checkpoint_is_none(store):
+    assert store.get("receipts") is None
+
+
+def test_checkpoints_only_move_forward(store):
+    store.advance("receipts", 100)
+    store.advance("receipts", 50)
+    assert store.get("receipts") == 100
+
+    store.advance("receipts", 200)
+    assert store.get("receipts") == 200
+
+
+def test_streams_are_independent(store):
+    store.advance("receipts", 100)
+    store.advance("reviews", 300)
+    assert store.get("receipts") == 100
+    assert store.get("reviews") == 300
+
+
+def test_sync_window_starts_after_the_checkpoint(store):
+    checkpoint = int(time.time()) - 600
+    store.advance("receipts", checkpoint)
+
+    start, end = store.sync_window("receipts", 17)
+    assert start == checkpoint + 1
+    assert end >= int(time.time()) - 1
+
+    start, _ = store.sync_window("receipts", 17, overlap=60)
+    assert start == checkpoint + 1 - 60
+
+
+def test_sync_window_falls_back_to_the_default_interval(store):
+    start, end = store.sync_window("receipts", 17)
+    assert end - start == pytest.approx(17 * 60, abs=2)
+
+
+def test_secret_is_only_written_on_a_meaningful_move():
+    sm_client = FakeSecretManagerClient()
+    store = SecretCheckpointStore(sm_client, min_advance=3600)
+
+    store.advance("receipts", 10_000)
+    store.advance("receipts", 10_600)
+    store.advance("receipts", 12_000)
+    assert sm_client.updates == 1
+    assert store.get("receipts") == 12_000
+
+    store.advance("receipts", 13_600)
+    assert sm_client.updates == 2
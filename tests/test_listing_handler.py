@@ -0,0 +1,109 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+Tests for the snapshot diffing of the listing_handler module.
+"""
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from lazyboost.handlers.listing_handler import ListingHandler
+from lazyboost.models.shopify_product_model import ShopifyListing, ShopifyVariant
+from lazyboost.utilities.sync_ledger import SQLiteSyncLedger
+
+
+class FakeEtsyClient:
+    def __init__(self, listings_by_state=None):
+        self.listings_by_state = listings_by_state or {}
+        self.calls = []
+        self.next_listing_id = 100
+
+    def iter_shop_listings(self, state):
+        return iter(self.listings_by_state.get(state, []))
+
+    def create_listing(self, data):
+        self.next_listing_id += 1
+        self.calls.append(("create", data["sku"]))
+        return {"listing_id": self.next_listing_id}
+
+    def update_listing(self, listing_id, data):
+        self.calls.append(("update", listing_id, data.get("state")))
+
+    def update_listing_inventory(self, listing_id, data):
+        quantity = data["products"][0]["offerings"][0]["quantity"]
+        self.calls.append(("inventory", listing_id, quantity))
+
+
+def shopify_listing(quantity, sku="SKU-1", title="Bow"):
+    variant = ShopifyVariant("1", "10.0", sku, quantity, [], datetime.now())
+    return ShopifyListing(
+        "10", title, "A bow", "Bows", "ACTIVE", datetime.now(), quantity, [], [variant], ["bow"]
+    )
+
+
+@pytest.fixture
+def sync(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        ShopifyListing,
+        "to_etsy_listing",
+        lambda self, variant: {
+            "title": self.title,
+            "price": float(variant.price),
+            "quantity": variant.inventory_quantity,
+            "sku": variant.sku,
+        },
+    )
+    handler = object.__new__(ListingHandler)
+    handler.etsy_client = FakeEtsyClient()
+    handler.snapshots = SQLiteSyncLedger(str(tmp_path / "snapshots.db"))
+    handler.actions = Counter()
+    handler._etsy_listings_by_sku = None
+    handler.timestamp_to_check = datetime.fromtimestamp(0)
+
+    def run(listing):
+        handler.etsy_client.calls.clear()
+        handler._sync_new_listing_to_etsy(listing)
+        return handler.etsy_client.calls
+
+    run.handler = handler
+    return run
+
+
+def test_new_variant_is_created_once(sync):
+    assert sync(shopify_listing(3)) == [("create", "SKU-1")]
+    assert sync(shopify_listing(3)) == []
+
+
+def test_only_changed_parts_are_updated(sync):
+    sync(shopify_listing(3))
+    assert sync(shopify_listing(2)) == [("inventory", 101, 2)]
+    assert sync(shopify_listing(2, title="Big bow")) == [("update", 101, None)]
+
+
+def test_out_of_stock_deactivates_and_restock_activates_the_listing(sync):
+    sync(shopify_listing(3))
+    assert sync(shopify_listing(0)) == [("update", 101, "inactive")]
+    assert sync(shopify_listing(0)) == []
+    assert sync(shopify_listing(4)) == [("inventory", 101, 4), ("update", 101, "active")]
+
+
+def test_listing_without_snapshot_is_found_by_sku(sync):
+    sync.handler.etsy_client = FakeEtsyClient({"inactive": [{"listing_id": 55, "skus": ["SKU-1"]}]})
+    assert sync(shopify_listing(3)) == [("update", 55, None), ("inventory", 55, 3)]
+    assert sync(shopify_listing(3)) == []
@@ -0,0 +1,127 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+Tests for the order sync of the order_handler and order_pipeline modules.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from lazyboost.handlers.order_handler import OrderHandler
+from lazyboost.models.shopify_order_model import ShopifyOrderResult
+from lazyboost.utilities import constants
+from lazyboost.utilities.checkpoint_store import FileCheckpointStore
+from lazyboost.utilities.sync_ledger import SQLiteSyncLedger
+
+
+def etsy_order(receipt_id, update_timestamp, user_id=None):
+    buyer = SimpleNamespace(user_id=user_id or f"buyer-{receipt_id}")
+    return SimpleNamespace(
+        receipt_id=receipt_id, update_timestamp=update_timestamp, buyer=buyer, transactions=[]
+    )
+
+
+class FakeShopifyClient:
+    def __init__(self, failing_receipts=(), unreachable_receipts=()):
+        self.failing_receipts = set(failing_receipts)
+        self.unreachable_receipts = set(unreachable_receipts)
+        self.created = []
+
+    def existing_orders(self, receipt_ids):
+        if self.unreachable_receipts.intersection(receipt_ids):
+            raise ConnectionError("Shopify unavailable")
+        return {}
+
+    def is_existing_customer(self, buyer):
+        return None
+
+    def upsert_customer(self, buyer, shopify_customer):
+        return hash(buyer.user_id) % 1000
+
+    def create_orders(self, orders):
+        results = {}
+        for order, _ in orders:
+            if order.receipt_id in self.failing_receipts:
+                results[order.receipt_id] = ShopifyOrderResult(order.receipt_id, errors=["bad"])
+            else:
+                self.created.append(order.receipt_id)
+                results[order.receipt_id] = ShopifyOrderResult(order.receipt_id, order.receipt_id)
+        return results
+
+
+@pytest.fixture
+def order_handler(tmp_path):
+    def build(orders, shopify_client):
+        handler = object.__new__(OrderHandler)
+        handler.etsy_client = SimpleNamespace(
+            sync_interval_orders=17, iter_shop_receipts=lambda **window: iter(orders)
+        )
+        handler.shopify_client = shopify_client
+        handler.checkpoints = FileCheckpointStore(str(tmp_path / "checkpoints.json"))
+        handler.ledger = SQLiteSyncLedger(str(tmp_path / "ledger.db"))
+        return handler
+
+    return build
+
+
+def test_successful_sync_advances_the_checkpoint_to_the_window_end(order_handler):
+    shopify_client = FakeShopifyClient()
+    handler = order_handler([etsy_order(1, 1000), etsy_order(2, 1100)], shopify_client)
+
+    handler._sync_etsy_orders()
+
+    checkpoint = handler.checkpoints.get(constants.CHECKPOINT_STREAM_ETSY_RECEIPTS)
+    assert sorted(shopify_client.created) == [1, 2]
+    assert checkpoint > 1100
+
+
+def test_failed_receipt_holds_the_checkpoint_back(order_handler):
+    shopify_client = FakeShopifyClient(failing_receipts={2})
+    orders = [etsy_order(1, 1000), etsy_order(2, 1100), etsy_order(3, 1200)]
+    handler = order_handler(orders, shopify_client)
+
+    with pytest.raises(RuntimeError, match="1 of 3 receipts failed"):
+        handler._sync_etsy_orders()
+
+    assert sorted(shopify_client.created) == [1, 3]
+    assert handler.checkpoints.get(constants.CHECKPOINT_STREAM_ETSY_RECEIPTS) == 1099
+
+
+def test_synced_receipts_are_skipped_on_the_next_run(order_handler):
+    shopify_client = FakeShopifyClient(failing_receipts={2})
+    orders = [etsy_order(1, 1000), etsy_order(2, 1100)]
+    handler = order_handler(orders, shopify_client)
+    with pytest.raises(RuntimeError):
+        handler._sync_etsy_orders()
+
+    shopify_client.failing_receipts.clear()
+    handler._sync_etsy_orders()
+
+    assert sorted(shopify_client.created) == [1, 2]
+
+
+def test_failed_existence_check_fails_its_batch_only(order_handler, monkeypatch):
+    monkeypatch.setattr(constants, "SHOPIFY_ORDER_TAG_BATCH_SIZE", 1)
+    shopify_client = FakeShopifyClient(unreachable_receipts={2})
+    orders = [etsy_order(1, 1000), etsy_order(2, 1100), etsy_order(3, 1200)]
+    handler = order_handler(orders, shopify_client)
+
+    with pytest.raises(RuntimeError, match="1 of 3 receipts failed"):
+        handler._sync_etsy_orders()
+
+    assert sorted(shopify_client.created) == [1, 3]
+    assert handler.checkpoints.get(constants.CHECKPOINT_STREAM_ETSY_RECEIPTS) == 1099
@@ -0,0 +1,136 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+Tests for the pipeline module.
+"""
+import threading
+import time
+
+import pytest
+
+from lazyboost.utilities.pipeline import Pipeline
+
+
+def test_map_and_batch_stages_process_every_item():
+    batches = []
+
+    def collect(items):
+        batches.append(list(items))
+        return []
+
+    stats = (
+        Pipeline("test", queue_size=2)
+        .source(lambda: range(10))
+        .map("double", lambda x: x * 2, workers=3)
+        .batch("collect", collect, 4)
+        .run()
+    )
+
+    assert sorted(x for batch in batches for x in batch) == [x * 2 for x in range(10)]
+    assert all(len(batch) <= 4 for batch in batches)
+    assert stats["source"]["items_out"] == 10
+    assert stats["double"]["items_in"] == stats["double"]["items_out"] == 10
+    assert stats["collect"]["items_in"] == 10
+
+
+def test_map_stage_drops_none_results():
+    outputs = []
+    Pipeline("test").source(lambda: range(6)).map("even", lambda x: x if x % 2 == 0 else None).map(
+        "collect", outputs.append
+    ).run()
+
+    assert sorted(outputs) == [0, 2, 4]
+
+
+def test_keyed_map_stage_keeps_items_of_a_key_in_order_on_one_worker():
+    seen = {}
+    active = set()
+    lock = threading.Lock()
+    overlaps = []
+
+    def process(item):
+        key, index = item
+        with lock:
+            if key in active:
+                overlaps.append(key)
+            active.add(key)
+        time.sleep(0.001)
+        with lock:
+            active.discard(key)
+            seen.setdefault(key, []).append((index, threading.current_thread().name))
+        return item
+
+    items = [(key, index) for index in range(20) for key in "abcde"]
+    Pipeline("test").source(lambda: items).map(
+        "keyed", process, workers=4, key=lambda item: item[0]
+    ).run()
+
+    assert not overlaps
+    for key, processed in seen.items():
+        assert [index for index, _ in processed] == list(range(20))
+        assert len({thread for _, thread in processed}) == 1
+
+
+def test_empty_source_runs_every_stage_to_completion():
+    calls = []
+    stats = (
+        Pipeline("test")
+        .source(lambda: [])
+        .map("map", calls.append, workers=2)
+        .batch("batch", lambda items: calls.extend(items) or [], 5)
+        .run()
+    )
+
+    assert calls == []
+    assert stats["source"]["items_out"] == 0
+    assert stats["map"]["items_in"] == 0
+    assert stats["batch"]["items_in"] == 0
+
+
+def test_stage_error_aborts_the_pipeline_and_is_raised():
+    processed = []
+
+    def fail_on_three(x):
+        if x == 3:
+            raise ValueError("boom")
+        return x
+
+    def slow_source():
+        for x in range(1000):
+            time.sleep(0.001)
+            yield x
+
+    pipeline = (
+        Pipeline("test", queue_size=1)
+        .source(slow_source)
+        .map("fail", fail_on_three)
+        .map("collect", processed.append)
+    )
+    with pytest.raises(ValueError, match="boom"):
+        pipeline.run()
+
+    assert 3 not in processed
+    assert pipeline.stats()["source"]["items_out"] < 1000
+
+
+def test_source_error_is_raised():
+    def broken_source():
+        yield 1
+        raise ConnectionError("page failed")
+
+    with pytest.raises(ConnectionError, match="page failed"):
+        Pipeline("test").source(broken_source).map("noop", lambda x: x).run()
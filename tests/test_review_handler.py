@@ -0,0 +1,95 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+Tests for the review sync of the review_handler module.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from lazyboost.handlers.review_handler import ReviewHandler
+from lazyboost.models.judge_me_model import JudgeMeReviewResult
+from lazyboost.utilities import constants
+from lazyboost.utilities.checkpoint_store import FileCheckpointStore
+from lazyboost.utilities.sync_ledger import SQLiteSyncLedger
+
+
+class FakeJudgeMeClient:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.published = []
+
+    def create_reviews(self, reviews):
+        results = {}
+        for key, _ in reviews:
+            if key in self.failing:
+                results[key] = JudgeMeReviewResult(key, error="rejected")
+            else:
+                self.published.append(key)
+                results[key] = JudgeMeReviewResult(key, response={"review": {"id": key}})
+        return results
+
+
+@pytest.fixture
+def review_handler(tmp_path):
+    def build(reviews, judge_me_client):
+        handler = object.__new__(ReviewHandler)
+        handler.bulk_publish = True
+        handler.etsy_client = SimpleNamespace(
+            sync_interval_reviews=17, iter_shop_reviews=lambda start, end: iter(reviews)
+        )
+        handler.judge_me_client = judge_me_client
+        handler.checkpoints = FileCheckpointStore(str(tmp_path / "checkpoints.json"))
+        handler.ledger = SQLiteSyncLedger(str(tmp_path / "ledger.db"))
+        handler.failed_reviews = []
+        handler.exported = []
+        handler._enrich_reviews = lambda batch: batch
+        handler._judge_me_reviews = lambda batch: ((r, {"id": r.transaction_id}) for r in batch)
+        handler.export_etsy_reviews = handler.exported.extend
+        return handler
+
+    return build
+
+
+def etsy_review(transaction_id, create_timestamp):
+    return SimpleNamespace(transaction_id=transaction_id, create_timestamp=create_timestamp)
+
+
+def test_published_reviews_advance_the_checkpoint(review_handler):
+    judge_me_client = FakeJudgeMeClient()
+    handler = review_handler([etsy_review(1, 1000), etsy_review(2, 1100)], judge_me_client)
+
+    handler.run()
+
+    assert sorted(judge_me_client.published) == [1, 2]
+    assert handler.checkpoints.get(constants.CHECKPOINT_STREAM_ETSY_REVIEWS) > 1100
+
+
+def test_failed_review_is_exported_and_holds_the_checkpoint_back(review_handler):
+    judge_me_client = FakeJudgeMeClient(failing={2})
+    reviews = [etsy_review(1, 1000), etsy_review(2, 1100), etsy_review(3, 1200)]
+    handler = review_handler(reviews, judge_me_client)
+
+    with pytest.raises(RuntimeError, match="1 reviews failed"):
+        handler.run()
+
+    assert [r.transaction_id for r in handler.exported] == [2]
+    assert handler.checkpoints.get(constants.CHECKPOINT_STREAM_ETSY_REVIEWS) == 1099
+
+    judge_me_client.failing.clear()
+    handler.run()
+    assert sorted(judge_me_client.published) == [1, 2, 3]
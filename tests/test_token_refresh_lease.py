@@ -0,0 +1,50 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+Tests for the token_refresh_lease module.
+"""
+import pytest
+
+from lazyboost.clients.token_refresh_lease import (
+    FileTokenLease,
+    token_refresh_lease_from_env,
+)
+
+
+def test_file_lease_is_exclusive_until_released(tmp_path):
+    path = str(tmp_path / "token.lock")
+    first, second = FileTokenLease(path), FileTokenLease(path)
+
+    assert first.acquire("a", 30)
+    assert not second.acquire("b", 30)
+
+    first.release("a")
+    assert second.acquire("b", 30)
+    second.release("b")
+
+
+def test_lease_defaults_to_a_file_without_state_table(monkeypatch):
+    monkeypatch.delenv("LAZYBOOST_STATE_TABLE", raising=False)
+    monkeypatch.delenv("ETSY_TOKEN_LEASE_BACKEND", raising=False)
+    assert isinstance(token_refresh_lease_from_env(), FileTokenLease)
+
+
+def test_dynamodb_lease_requires_a_state_table(monkeypatch):
+    monkeypatch.delenv("LAZYBOOST_STATE_TABLE", raising=False)
+    monkeypatch.setenv("ETSY_TOKEN_LEASE_BACKEND", "dynamodb")
+    with pytest.raises(ValueError):
+        token_refresh_lease_from_env()
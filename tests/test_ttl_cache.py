@@ -0,0 +1,77 @@
+#  LazyBoost: A lazy pythonian way to sync stuff between Shopify and Etsy.
+#  Copyright (C) 2024  Ankit Patterson
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""
+Tests for the ttl_cache module.
+"""
+import json
+
+import pytest
+
+from lazyboost.utilities.ttl_cache import TTLCache
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "cache.json")
+
+
+def new_cache(path):
+    return TTLCache(max_size=10, ttl=60, negative_ttl=5, persist_path=path)
+
+
+def test_saved_entries_are_loaded_by_a_new_cache(cache_path):
+    cache = new_cache(cache_path)
+    cache.put("a", {"id": 1})
+    cache.put("b", None, negative=True)
+    cache.save(lambda value: value)
+
+    loaded = new_cache(cache_path)
+    loaded.load(lambda value: value)
+    assert loaded.get("a") == (True, {"id": 1})
+    assert loaded.get("b") == (True, None)
+
+
+def test_invalidated_entry_is_not_loaded_after_a_save(cache_path):
+    cache = new_cache(cache_path)
+    cache.put("a", {"id": 1})
+    cache.save(lambda value: value)
+
+    assert cache.invalidate("a")
+    assert not cache.invalidate("a")
+    cache.save(lambda value: value)
+
+    loaded = new_cache(cache_path)
+    loaded.load(lambda value: value)
+    assert loaded.get("a") == (False, None)
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "not json",
+        json.dumps({"a": 1}),
+        json.dumps([["a", 9999999999, False]]),
+        json.dumps([["a", 9999999999, False, {"unexpected": 1}]]),
+    ],
+)
+def test_unusable_cache_file_is_ignored(cache_path, content):
+    with open(cache_path, "w") as cache_file:
+        cache_file.write(content)
+
+    cache = new_cache(cache_path)
+    cache.load(lambda value: value["id"])
+    assert cache.stats["size"] == 0